@@ -1,7 +1,63 @@
 from django.contrib import admin
+from django.db.models import F
+
+from .catalog_cache import bump_catalog_version
 from .models import Product, Refund, Purchase
+from .pagination import EstimatedCountPaginator
+from .refunds import approve_refunds, reject_refunds
+from .search import search_products
+
+RESTOCK_QUANTITY = 100
+
+
+class PerformanceAdmin(admin.ModelAdmin):
+    # Skip the second, unfiltered COUNT(*) and estimate the first one on large tables.
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
+
+@admin.register(Product)
+class ProductAdmin(PerformanceAdmin):
+    list_display = ('id', 'sku', 'name', 'price', 'stock', 'updated_at')
+    search_fields = ('name',)
+    actions = ('restock',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # The full-text index replaces the default icontains scan on name; prefix tokens keep type-ahead working.
+        return search_products(queryset, search_term, prefix=True), False
+
+    @admin.action(description=f'Add {RESTOCK_QUANTITY} units of stock to selected products')
+    def restock(self, request, queryset):
+        restocked = queryset.update(stock=F('stock') + RESTOCK_QUANTITY)
+        bump_catalog_version()
+        self.message_user(request, f'{restocked} products restocked.')
+
+
+@admin.register(Purchase)
+class PurchaseAdmin(PerformanceAdmin):
+    list_display = ('id', 'user', 'product', 'quantity', 'unit_price', 'purchase_time', 'refundable_until')
+    list_select_related = ('user', 'product')
+    list_filter = ('purchase_time', 'refundable_until')
+    search_fields = ('=user__username',)
+    raw_id_fields = ('user',)
+    autocomplete_fields = ('product',)
+
+
+@admin.register(Refund)
+class RefundAdmin(PerformanceAdmin):
+    list_display = ('id', 'refund_purchase', 'refund_time')
+    list_select_related = ('refund_purchase__user',)
+    list_filter = ('refund_time',)
+    search_fields = ('=refund_purchase__user__username',)
+    raw_id_fields = ('refund_purchase',)
+    actions = ('approve', 'reject')
 
+    @admin.action(description='Approve selected refunds')
+    def approve(self, request, queryset):
+        approved = approve_refunds(queryset.values_list('pk', flat=True))
+        self.message_user(request, f'{approved} refunds approved.')
 
-admin.site.register(Product)
-admin.site.register(Refund)
-admin.site.register(Purchase)
+    @admin.action(description='Reject selected refunds')
+    def reject(self, request, queryset):
+        rejected = reject_refunds(queryset.values_list('pk', flat=True))
+        self.message_user(request, f'{rejected} refunds rejected.')
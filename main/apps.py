@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import auth, signals, tasks  # noqa: F401
+        from .metrics import install_template_timer, install_timer
+        connection_created.connect(install_timer)
+        install_template_timer()
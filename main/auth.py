@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core import checks
+from django.core.cache import cache
+from django.db import transaction
+
+
+# Caches that live inside one worker process; invalidation there never reaches the other workers.
+PER_PROCESS_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend that serves the per-request session user from the cache instead of a SELECT."""
+
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                # Cache the ledger balance with the user so the wallet in the page header costs nothing either.
+                user.balance
+                cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+        return user
+
+
+def forget_users(user_ids):
+    """Drop cached users now and again after commit; call whenever a user row (e.g. wallet) changes."""
+    keys = [user_cache_key(user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+@checks.register(checks.Tags.security)
+def check_shared_user_cache(app_configs, **kwargs):
+    """Deactivation, demotion and password changes must reach every worker, so the user cache must be shared."""
+    backend = f'{CachedModelBackend.__module__}.{CachedModelBackend.__qualname__}'
+    if backend in settings.AUTHENTICATION_BACKENDS and settings.CACHES['default']['BACKEND'] in PER_PROCESS_CACHES:
+        return [checks.Error(
+            'CachedModelBackend needs a default cache shared by all workers.',
+            hint='Set SHOP_CACHE to file or db, or SHOP_USER_CACHE=0.',
+            id='main.E001',
+        )]
+    return []
@@ -0,0 +1,28 @@
+from django.db.models import Case, F, When
+
+
+def add_fields_by_pk(model, rows):
+    """Add per-row deltas, given as ``{pk: {field: delta}}``, with one UPDATE ... CASE statement."""
+    if not rows:
+        return 0
+    fields = {field for deltas in rows.values() for field in deltas}
+    return model.objects.filter(pk__in=rows).update(**{field: Case(
+        *(When(pk=pk, then=F(field) + deltas[field]) for pk, deltas in rows.items() if field in deltas),
+        default=F(field),
+        output_field=model._meta.get_field(field).clone(),
+    ) for field in fields})
+
+
+def add_by_pk(model, field, deltas):
+    return add_fields_by_pk(model, {pk: {field: delta} for pk, delta in deltas.items()})
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,115 @@
+import hashlib
+import threading
+import time
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .routers import primary_reads
+
+VERSION_KEY = 'catalog:version'
+MODIFIED_KEY = 'catalog:modified'
+
+
+class CatalogCache:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            # Start from the clock so an evicted version never reuses keys of an older catalog.
+            cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+            version = cache.get(VERSION_KEY, 0)
+        return version
+
+    def bump(self):
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+        cache.set(MODIFIED_KEY, timezone.now(), timeout=None)
+
+    def last_modified(self):
+        modified = cache.get(MODIFIED_KEY)
+        if modified is None:
+            cache.add(MODIFIED_KEY, timezone.now(), timeout=None)
+            modified = cache.get(MODIFIED_KEY, timezone.now())
+        return modified
+
+    async def alast_modified(self):
+        modified = await cache.aget(MODIFIED_KEY)
+        if modified is None:
+            await cache.aadd(MODIFIED_KEY, timezone.now(), timeout=None)
+            modified = await cache.aget(MODIFIED_KEY, timezone.now())
+        return modified
+
+    async def aversion(self):
+        version = await cache.aget(VERSION_KEY)
+        if version is None:
+            await cache.aadd(VERSION_KEY, time.time_ns(), timeout=None)
+            version = await cache.aget(VERSION_KEY, 0)
+        return version
+
+    def key(self, name, *parts, version=None):
+        digest = hashlib.md5(repr(parts).encode()).hexdigest()
+        return f'catalog:{self.version() if version is None else version}:{name}:{digest}'
+
+    def count(self, value):
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+    def fill_reads(self, modified):
+        # Right after a change the replica may still serve the old catalog; never cache that under the new version.
+        if timezone.now() - modified < timedelta(seconds=settings.REPLICA_STICKY_SECONDS):
+            return primary_reads()
+        return nullcontext()
+
+    def get_or_set(self, name, parts, compute):
+        key = self.key(name, *parts)
+        value = cache.get(key)
+        self.count(value)
+        if value is None:
+            with self.fill_reads(self.last_modified()):
+                value = compute()
+            cache.set(key, value, settings.CATALOG_CACHE_TIMEOUT)
+        return value
+
+    async def aget_or_set(self, name, parts, compute):
+        key = self.key(name, *parts, version=await self.aversion())
+        value = await cache.aget(key)
+        self.count(value)
+        if value is None:
+            with self.fill_reads(await self.alast_modified()):
+                value = await compute()
+            await cache.aset(key, value, settings.CATALOG_CACHE_TIMEOUT)
+        return value
+
+    def reset_stats(self):
+        with self.lock:
+            self.hits = self.misses = 0
+
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'hit_ratio': self.hit_ratio()}
+
+
+catalog_cache = CatalogCache()
+
+
+def bump_catalog_version():
+    # Bump again after commit so a page cached from pre-commit rows in the meantime is dropped too.
+    catalog_cache.bump()
+    transaction.on_commit(catalog_cache.bump)
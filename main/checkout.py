@@ -0,0 +1,112 @@
+from django.db import transaction
+from django.utils import timezone
+
+from . import stock, wallet
+from .bulk import add_by_pk
+from .catalog_cache import bump_catalog_version
+from .jobs import enqueue
+from .models import Product, Purchase
+from .retry import with_retry
+
+
+# PositiveIntegerField's range; larger values overflow in the database driver instead of failing a check.
+MAX_QUANTITY = 2147483647
+
+
+def check_quantity(quantity):
+    if not 1 <= quantity <= MAX_QUANTITY:
+        raise ValueError(f'Quantity must be between 1 and {MAX_QUANTITY}.')
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class OutOfStock(CheckoutError):
+    pass
+
+
+class InsufficientFunds(CheckoutError):
+    pass
+
+
+def _debit(user_id, amount):
+    try:
+        wallet.debit(user_id, amount)
+    except wallet.InsufficientFunds as error:
+        raise InsufficientFunds(str(error))
+
+
+def _take_stock(product_id, quantity):
+    try:
+        return stock.take_stock(product_id, quantity)
+    except stock.OutOfStock as error:
+        raise OutOfStock(str(error))
+
+
+def _charge(user_id, product_id, quantity):
+    """Debit and record a purchase of units already taken from stock."""
+    price = Product.objects.filter(pk=product_id).values_list('price', flat=True).get()
+    total_price = price * quantity
+    _debit(user_id, total_price)
+
+    bump_catalog_version()
+    enqueue('update_sales_stats', lines=[(product_id, quantity, total_price)], when=timezone.now())
+    return Purchase.objects.create(user_id=user_id, product_id=product_id, quantity=quantity, unit_price=price)
+
+
+def _buy(user_id, product_id, quantity):
+    with transaction.atomic():
+        _take_stock(product_id, quantity)
+        return _charge(user_id, product_id, quantity)
+
+
+def buy_product(user, product_id, quantity):
+    check_quantity(quantity)
+    return with_retry(_buy, user.pk, product_id, quantity)
+
+
+def _buy_cart(user_id, quantities):
+    with transaction.atomic():
+        # Lock in primary key order so carts with overlapping products cannot deadlock; in_bulk drops ordering.
+        locked = stock.with_available_stock(
+            Product.objects.select_for_update().only('pk', 'price', 'stock').filter(pk__in=list(quantities)),
+        ).order_by('pk')
+        products = {product.pk: product for product in locked}
+        missing = set(quantities) - set(products)
+        if missing:
+            raise Product.DoesNotExist(f'Unknown products: {sorted(missing)}')
+
+        short = [product.pk for product in products.values() if product.available_stock < quantities[product.pk]]
+        if short:
+            raise OutOfStock(f'Not enough items in stock for products: {sorted(short)}')
+
+        total_price = sum(products[pk].price * quantity for pk, quantity in quantities.items())
+        _debit(user_id, total_price)
+
+        # Lines the locked product row covers take in one UPDATE; sharded products go through take_stock.
+        row_takes = {pk: quantity for pk, quantity in quantities.items() if products[pk].stock >= quantity}
+        add_by_pk(Product, 'stock', {pk: -quantity for pk, quantity in row_takes.items()})
+        for pk in quantities.keys() - row_takes.keys():
+            _take_stock(pk, quantities[pk])
+        bump_catalog_version()
+        enqueue('update_sales_stats', when=timezone.now(), lines=[
+            (pk, quantity, products[pk].price * quantity) for pk, quantity in quantities.items()
+        ])
+        refundable_until = Purchase.refund_deadline()
+        return Purchase.objects.bulk_create(
+            Purchase(user_id=user_id, product_id=pk, quantity=quantity, unit_price=products[pk].price,
+                     refundable_until=refundable_until)
+            for pk, quantity in quantities.items()
+        )
+
+
+def buy_cart(user, items):
+    quantities = {}
+    for product_id, quantity in items:
+        check_quantity(quantity)
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+        check_quantity(quantities[product_id])
+    if not quantities:
+        raise ValueError('The cart is empty.')
+    return with_retry(_buy_cart, user.pk, quantities)
@@ -0,0 +1,53 @@
+import csv
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .bulk import batched
+from .models import Purchase, Refund
+
+CHUNK_SIZE = 2000
+
+PURCHASE_COLUMNS = (
+    'id', 'purchase_time', 'user_id', 'user__username', 'product_id', 'product__name', 'quantity', 'unit_price',
+)
+REFUND_COLUMNS = (
+    'id', 'refund_time', 'refund_purchase_id', 'refund_purchase__user__username', 'refund_purchase__product__name',
+    'refund_purchase__quantity', 'refund_purchase__unit_price',
+)
+
+EXPORTS = {
+    'purchases': (Purchase, 'purchase_time', PURCHASE_COLUMNS),
+    'refunds': (Refund, 'refund_time', REFUND_COLUMNS),
+}
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def csv_chunks(columns, rows, chunk_size=CHUNK_SIZE):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for batch in batched(rows, chunk_size):
+        yield ''.join(writer.writerow(row) for row in batch)
+
+
+def ndjson_chunks(columns, rows, chunk_size=CHUNK_SIZE):
+    encoder = DjangoJSONEncoder()
+    for batch in batched(rows, chunk_size):
+        yield ''.join(encoder.encode(dict(zip(columns, row))) + '\n' for row in batch)
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_rows(queryset, columns, chunk_size=CHUNK_SIZE):
+    return queryset.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size)
@@ -0,0 +1,24 @@
+from datetime import date, datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+
+def parse_day(value):
+    try:
+        day = parse_date(value or '')
+    except ValueError:
+        return None
+    return day and timezone.make_aware(datetime.combine(day, time.min))
+
+
+def filter_date_range(queryset, field, params):
+    """Limit ``field`` to the whole days between the ``from`` and ``to`` query parameters."""
+    start = parse_day(params.get('from'))
+    if start:
+        queryset = queryset.filter(**{f'{field}__gte': start})
+    end = parse_day(params.get('to'))
+    # The day after the last representable date would overflow; that range has no upper bound anyway.
+    if end and end.date() < date.max:
+        queryset = queryset.filter(**{f'{field}__lt': end + timedelta(days=1)})
+    return queryset
@@ -13,7 +13,12 @@ def RefundForm(request, purchase_id):
 class ProductForm(forms.ModelForm):
     class Meta:
         model = Product
-        fields = ['name', 'description', 'price', 'stock']
+        fields = ['sku', 'name', 'description', 'price', 'stock']
+
+class ProductImportUploadForm(forms.Form):
+    file = forms.FileField()
+    format = forms.ChoiceField(choices=[('csv', 'CSV'), ('ndjson', 'NDJSON'), ('json', 'JSON array')])
+    dry_run = forms.BooleanField(required=False)
 
 class UserCreationForm(forms.ModelForm):
     error_messages = {
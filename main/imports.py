@@ -0,0 +1,78 @@
+import csv
+import json
+import time
+
+from django.db import transaction
+
+from .bulk import batched
+from .catalog_cache import bump_catalog_version
+from .forms import ProductForm
+from .models import Product
+from .search import index_products
+
+BATCH_SIZE = 1000
+UPDATE_FIELDS = [field for field in ProductForm.Meta.fields if field != 'sku'] + ['updated_at']
+
+
+class ProductImportForm(ProductForm):
+    def validate_unique(self):
+        # Existing SKUs are updated by the upsert, so skip the per-row uniqueness query.
+        pass
+
+
+def read_rows(file, file_format):
+    """Yield ``(line, row)`` pairs from a CSV, NDJSON or JSON array file; only the array is read at once."""
+    if file_format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+    elif file_format == 'ndjson':
+        for line, text in enumerate(file, start=1):
+            if text.strip():
+                yield line, json.loads(text)
+    else:
+        yield from enumerate(json.load(file), start=1)
+
+
+def _validate(batch):
+    products, rejected = {}, []
+    for line, row in batch:
+        if not isinstance(row, dict):
+            rejected.append((line, {'__all__': [{'message': 'Each row must be an object.', 'code': 'invalid'}]}))
+            continue
+        form = ProductImportForm(row)
+        if not form.is_valid():
+            rejected.append((line, form.errors.get_json_data()))
+        elif not form.cleaned_data['sku']:
+            rejected.append((line, {'sku': [{'message': 'A SKU is required for imports.', 'code': 'required'}]}))
+        else:
+            # Later rows win when a feed repeats a SKU.
+            products[form.cleaned_data['sku']] = Product(**form.cleaned_data)
+    return products, rejected
+
+
+def _upsert(products):
+    with transaction.atomic():
+        Product.objects.bulk_create(
+            products.values(), update_conflicts=True, unique_fields=['sku'], update_fields=UPDATE_FIELDS,
+        )
+        index_products(list(Product.objects.filter(sku__in=products).values_list('pk', flat=True)))
+        bump_catalog_version()
+
+
+def import_products(rows, batch_size=BATCH_SIZE, dry_run=False):
+    """Validate and upsert ``(line, row)`` pairs by SKU, yielding one report dict per batch."""
+    for number, batch in enumerate(batched(rows, batch_size), start=1):
+        start = time.perf_counter()
+        products, rejected = _validate(batch)
+        if products and not dry_run:
+            _upsert(products)
+        elapsed = time.perf_counter() - start
+        yield {
+            'batch': number,
+            'rows': len(batch),
+            'imported': len(products),
+            'rejected': rejected,
+            'seconds': elapsed,
+            'rows_per_second': len(batch) / elapsed if elapsed else 0.0,
+        }
@@ -0,0 +1,140 @@
+import os
+import time
+import traceback
+import uuid
+from datetime import timedelta
+from functools import partial
+
+from django.db import connection, transaction
+from django.db.models import Count, Min, Q, Subquery
+from django.utils import timezone
+
+from .metrics import percentile
+from .models import Job
+from .retry import with_retry
+
+BATCH_SIZE = 50
+LEASE = timedelta(minutes=5)
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 2
+BACKOFF_MAX = 600
+
+TASKS = {}
+
+
+def task(func):
+    """Register ``func`` as a job handler under its name; payloads are passed as keyword arguments."""
+    TASKS[func.__name__] = func
+    return func
+
+
+def enqueue(name, **payload):
+    """Queue ``name`` once the current transaction commits, so rolled back work never runs."""
+    if name not in TASKS:
+        raise KeyError(f'Unknown task {name}.')
+    # The caller's work has committed by then, so a failed insert is logged instead of raised.
+    transaction.on_commit(partial(with_retry, Job.objects.create, name=name, payload=payload), robust=True)
+
+
+def _ready(now):
+    return Job.objects.filter(status=Job.PENDING, run_at__lte=now).filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+    ).order_by('run_at')
+
+
+def claim(batch_size=BATCH_SIZE):
+    """Lease up to ``batch_size`` ready jobs to the calling worker."""
+    now = timezone.now()
+    worker = f'{os.getpid()}-{uuid.uuid4().hex}'
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            ids = list(_ready(now).select_for_update(skip_locked=True).values_list('pk', flat=True)[:batch_size])
+        else:
+            # SQLite has a single writer: claiming in one UPDATE never upgrades a read lock mid-transaction.
+            ids = Subquery(_ready(now).values('pk')[:batch_size])
+        Job.objects.filter(pk__in=ids).update(locked_by=worker, locked_until=now + LEASE)
+        return list(Job.objects.filter(locked_by=worker).order_by('run_at'))
+
+
+def run(job):
+    """Run one claimed job; its side effects and the job's removal commit together.
+
+    Returns None without running the task when the lease expired and another worker reclaimed the job.
+    """
+    leased = Job.objects.filter(pk=job.pk, locked_by=job.locked_by)
+    try:
+        with transaction.atomic():
+            # Delete first so SQLite takes the write lock before the task reads; a failure rolls it back.
+            if not leased.delete()[0]:
+                return None
+            TASKS[job.name](**job.payload)
+        return True
+    except Exception:
+        attempts = job.attempts + 1
+        # Losing this write to a busy database would leave the job leased until its lease runs out.
+        with_retry(
+            leased.update,
+            attempts=attempts,
+            status=Job.FAILED if attempts >= MAX_ATTEMPTS else Job.PENDING,
+            run_at=timezone.now() + timedelta(seconds=min(BACKOFF_MAX, BACKOFF_BASE ** attempts)),
+            locked_by='',
+            locked_until=None,
+            last_error=traceback.format_exc(),
+        )
+        return False
+
+
+class WorkerStats:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.done = 0
+        self.failed = 0
+        self.lags = []
+
+    def record(self, job, ok):
+        if ok is None:
+            return
+        self.lags.append((timezone.now() - job.run_at).total_seconds())
+        if ok:
+            self.done += 1
+        else:
+            self.failed += 1
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start
+        return {
+            'done': self.done,
+            'failed': self.failed,
+            'jobs_per_second': self.done / elapsed if elapsed else 0.0,
+            'lag_p50_s': percentile(self.lags, 0.50),
+            'lag_p95_s': percentile(self.lags, 0.95),
+        }
+
+
+def work(batch_size=BATCH_SIZE, stats=None):
+    """Claim and run one batch; returns how many jobs it ran."""
+    jobs = claim(batch_size)
+    for job in jobs:
+        ok = run(job)
+        if stats is not None:
+            stats.record(job, ok)
+    return len(jobs)
+
+
+def drain(batch_size=BATCH_SIZE):
+    """Run ready jobs until none are left."""
+    stats = WorkerStats()
+    while work(batch_size, stats):
+        pass
+    return stats.summary()
+
+
+def queue_stats():
+    now = timezone.now()
+    counts = dict(Job.objects.values_list('status').annotate(count=Count('pk')).order_by())
+    oldest = _ready(now).aggregate(oldest=Min('run_at'))['oldest']
+    return {
+        'pending': counts.get(Job.PENDING, 0),
+        'failed': counts.get(Job.FAILED, 0),
+        'lag_seconds': (now - oldest).total_seconds() if oldest else 0.0,
+    }
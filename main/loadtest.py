@@ -0,0 +1,102 @@
+import http.client
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from .metrics import percentile
+
+
+def summarize(latencies, errors, elapsed):
+    return {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def run_client_load(request, concurrency, total, make_client=Client):
+    """Call ``request(client, i)`` ``total`` times in-process, one test client per worker.
+
+    ``make_client(worker)`` builds each worker's client; a single worker runs on the calling thread.
+    """
+    latencies, query_counts, errors = [], [], 0
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker(index):
+        nonlocal errors
+        client = make_client(index)
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            start = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                response = request(client, i)
+            elapsed = time.perf_counter() - start
+            with lock:
+                if response.status_code < 400:
+                    latencies.append(elapsed)
+                    query_counts.append(len(queries))
+                else:
+                    errors += 1
+
+    start = time.perf_counter()
+    if concurrency == 1:
+        worker(0)
+    else:
+        def thread_worker(index):
+            try:
+                worker(index)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(thread_worker, range(concurrency)))
+    stats = summarize(latencies, errors, time.perf_counter() - start)
+    stats['queries_per_request'] = sum(query_counts) / len(query_counts) if query_counts else 0.0
+    return stats
+
+
+def run_http_load(base_url, paths, concurrency, total):
+    """GET ``paths`` round-robin against a running server from ``concurrency`` keep-alive connections."""
+    url = urlsplit(base_url)
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        nonlocal errors
+        connection = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                connection.request('GET', url.path.rstrip('/') + paths[i % len(paths)])
+                response = connection.getresponse()
+                response.read()
+                ok = response.status < 500
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+                ok = False
+            with lock:
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+        connection.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    return summarize(latencies, errors, time.perf_counter() - start)
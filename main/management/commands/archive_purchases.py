@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from main.models import Purchase, PurchaseArchive
+
+ARCHIVED_FIELDS = ('id', 'user_id', 'product_id', 'quantity', 'unit_price', 'purchase_time')
+
+
+class Command(BaseCommand):
+    help = 'Move purchases older than N days into the PurchaseArchive table in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        # Purchases with a pending refund stay in the hot table until the refund is processed.
+        old_purchases = Purchase.objects.filter(purchase_time__lt=cutoff, refund__isnull=True).order_by('purchase_time')
+
+        archived = 0
+        while True:
+            with transaction.atomic():
+                rows = list(old_purchases.values_list(*ARCHIVED_FIELDS)[:options['batch_size']])
+                if not rows:
+                    break
+                PurchaseArchive.objects.bulk_create(PurchaseArchive(**dict(zip(ARCHIVED_FIELDS, row))) for row in rows)
+                Purchase.objects.filter(pk__in=[row[0] for row in rows]).delete()
+            archived += len(rows)
+            self.stdout.write(f'Archived {archived} purchases')
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {archived} purchases older than {cutoff:%Y-%m-%d} archived.'))
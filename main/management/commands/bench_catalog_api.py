@@ -0,0 +1,52 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from main.catalog_cache import catalog_cache
+from main.models import Product
+from main.views import ProductApi, ProductList
+
+
+class Command(BaseCommand):
+    help = 'Compare payload size and requests per second of the HTML catalog, the JSON API and its 304 path.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--requests', type=int, default=500)
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        with transaction.atomic():
+            Product.objects.bulk_create(
+                Product(name=f'Product {i}', description='Benchmark product', stock=10)
+                for i in range(options['products'])
+            )
+            catalog_cache.bump()
+
+            etag = ProductApi.as_view()(factory.get('/api/products/'))['ETag']
+            cases = (
+                ('html', ProductList, {}, {}),
+                ('json', ProductApi, {}, {}),
+                ('json (name,price)', ProductApi, {'fields': 'name,price'}, {}),
+                ('json 304', ProductApi, {}, {'HTTP_IF_NONE_MATCH': etag}),
+            )
+            for name, view_class, params, headers in cases:
+                view = view_class.as_view()
+                start = time.perf_counter()
+                for _ in range(options['requests']):
+                    request = factory.get('/', params, **headers)
+                    request.user = AnonymousUser()
+                    response = view(request)
+                    if hasattr(response, 'render'):
+                        response.render()
+                rate = options['requests'] / (time.perf_counter() - start)
+                size = len(response.content)
+                self.stdout.write(
+                    f'{name:>18}: {rate:8.1f} req/s, {response.status_code} {size} bytes '
+                    f'({size / view_class.page_size:.0f} bytes per product)'
+                )
+
+            transaction.set_rollback(True)
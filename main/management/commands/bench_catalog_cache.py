@@ -0,0 +1,47 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+
+from main.catalog_cache import catalog_cache
+from main.models import Product
+from main.views import ProductList
+
+UNCACHED = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+class Command(BaseCommand):
+    help = 'Compare ProductList requests per second with and without the catalog cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--requests', type=int, default=500)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            Product.objects.bulk_create(
+                Product(name=f'Product {i}', description='Benchmark product', stock=10)
+                for i in range(options['products'])
+            )
+            catalog_cache.bump()
+
+            with override_settings(CACHES=UNCACHED):
+                uncached = self.measure(options['requests'])
+            catalog_cache.reset_stats()
+            cached = self.measure(options['requests'])
+            self.stdout.write(f'uncached: {uncached:.1f} req/s')
+            self.stdout.write(f'cached:   {cached:.1f} req/s (hit ratio {catalog_cache.hit_ratio():.2%})')
+
+            transaction.set_rollback(True)
+
+    def measure(self, count):
+        view = ProductList.as_view()
+        factory = RequestFactory()
+        start = time.perf_counter()
+        for i in range(count):
+            request = factory.get('/product_list/', {'after': i % 50 * ProductList.page_size} if i % 2 else {})
+            request.user = AnonymousUser()
+            view(request).render()
+        return count / (time.perf_counter() - start)
@@ -0,0 +1,87 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+
+from main.checkout import CheckoutError, buy_product
+from main.retry import conflicts
+from main.models import Product, Purchase, User
+
+
+def legacy_buy(user, product_id, quantity):
+    product = Product.objects.get(id=product_id)
+    user = User.objects.get(pk=user.pk)
+    if product.stock < quantity:
+        raise CheckoutError('Not enough items in stock.')
+    total_price = product.price * quantity
+    if total_price > user.wallet:
+        raise CheckoutError("You don't have enough money.")
+    user.wallet -= total_price
+    user.save()
+    Purchase.objects.create(user=user, product=product, quantity=quantity)
+    product.stock -= quantity
+    product.save()
+
+
+class Command(BaseCommand):
+    help = 'Hammer one hot product from many threads with the legacy and the atomic checkout paths.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--attempts', type=int, default=50, help='Purchase attempts per thread.')
+        parser.add_argument('--stock', type=int, default=200)
+        parser.add_argument('--paths', default='legacy,atomic', help='Comma separated: legacy, atomic.')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                journal_mode = cursor.execute('PRAGMA journal_mode').fetchone()[0]
+                synchronous = cursor.execute('PRAGMA synchronous').fetchone()[0]
+            self.stdout.write(f'sqlite journal_mode={journal_mode} synchronous={synchronous}')
+
+        paths = {'legacy': legacy_buy, 'atomic': buy_product}
+        for name in options['paths'].split(','):
+            self.run(name, paths[name], options)
+
+    def run(self, name, buy, options):
+        product = Product.objects.create(name='Hot product', description='Benchmark', price=1, stock=options['stock'])
+        users = [
+            User.objects.create(username=f'bench-checkout-{name}-{i}', wallet=10 ** 6)
+            for i in range(options['threads'])
+        ]
+        results = {'ok': 0, 'rejected': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def worker(user):
+            for _ in range(options['attempts']):
+                try:
+                    buy(user, product.pk, 1)
+                    outcome = 'ok'
+                except CheckoutError:
+                    outcome = 'rejected'
+                except DatabaseError:
+                    outcome = 'errors'
+                with lock:
+                    results[outcome] += 1
+            connection.close()
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        product.refresh_from_db()
+        sold = Purchase.objects.filter(product=product).count()
+        oversold = sold - options['stock'] + product.stock
+        self.stdout.write(
+            f"{name}: {results['ok'] / elapsed:.1f} checkouts/s, ok={results['ok']} rejected={results['rejected']} "
+            f"errors={results['errors']} sold={sold} stock_left={product.stock} oversold={oversold} "
+            f"conflicts/s={conflicts.per_second():.2f}"
+        )
+
+        product.delete()
+        User.objects.filter(pk__in=[user.pk for user in users]).delete()
@@ -0,0 +1,43 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.exports import PURCHASE_COLUMNS, csv_chunks, export_rows, gzip_chunks
+from main.models import Product, Purchase, User
+
+
+class Command(BaseCommand):
+    help = 'Stream a purchase export of N rows and report time and peak Python memory (rolled back afterwards).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--gzip', action='store_true')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = User.objects.create(username='bench-export')
+            product = Product.objects.create(name='Export product', description='Benchmark', stock=0)
+            for start in range(0, options['rows'], options['batch_size']):
+                count = min(options['batch_size'], options['rows'] - start)
+                Purchase.objects.bulk_create(
+                    Purchase(user=user, product=product, quantity=1, unit_price=100) for _ in range(count)
+                )
+
+            chunks = csv_chunks(PURCHASE_COLUMNS, export_rows(Purchase.objects.all(), PURCHASE_COLUMNS))
+            if options['gzip']:
+                chunks = gzip_chunks(chunks)
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            size = sum(len(chunk) for chunk in chunks)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            self.stdout.write(
+                f"{options['rows']} rows: {size / 2 ** 20:.1f} MiB in {elapsed:.2f}s, peak memory {peak / 2 ** 20:.2f} MiB"
+            )
+            transaction.set_rollback(True)
@@ -0,0 +1,54 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+
+from main.models import Product
+from main.views import ProductList
+
+
+DUMMY_CACHE = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+
+
+class Command(BaseCommand):
+    help = 'Measure ProductList per-page latency as the catalog grows (runs in a rolled back transaction).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000,1000000')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    # The catalog and fragment caches would serve every repeat, and bulk_create never bumps the catalog
+    # version, so larger catalogs would be timed against the first size's cached page.
+    @override_settings(CACHES={'default': DUMMY_CACHE, 'template_fragments': DUMMY_CACHE})
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        view = ProductList.as_view()
+        factory = RequestFactory()
+
+        with transaction.atomic():
+            created = Product.objects.count()
+            for size in sizes:
+                while created < size:
+                    batch = min(options['batch_size'], size - created)
+                    Product.objects.bulk_create(
+                        Product(name=f'Product {created + i}', description='Benchmark product', stock=10)
+                        for i in range(batch)
+                    )
+                    created += batch
+
+                deep_cursor = Product.objects.order_by('-pk').values_list('pk', flat=True)[ProductList.page_size * 2]
+                first = self.measure(view, factory.get('/product_list/'), options['repeat'])
+                deep = self.measure(view, factory.get('/product_list/', {'after': deep_cursor}), options['repeat'])
+                self.stdout.write(f'{size:>9} products: first page {first:.2f} ms, deep page {deep:.2f} ms')
+
+            transaction.set_rollback(True)
+
+    def measure(self, view, request, repeat):
+        request.user = AnonymousUser()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            view(request).render()
+        return (time.perf_counter() - start) * 1000 / repeat
@@ -0,0 +1,53 @@
+import re
+import time
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template import engines
+from django.template.loader import get_template
+from django.test import RequestFactory
+
+from main.models import Product, User
+from main.stock import with_available_stock
+
+TEMPLATE = 'main/product/product_list.html'
+
+
+class Command(BaseCommand):
+    help = 'Time rendering the product list with and without per-product fragment caching (rolled back).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        template = get_template(TEMPLATE)
+        source = template.template.source
+        uncached = engines['django'].from_string(re.sub(r'{% (cache [^%]*|endcache) %}', '', source))
+
+        with transaction.atomic():
+            Product.objects.bulk_create(
+                Product(name=f'Product {i}', description='Benchmark product ' * 5, stock=10)
+                for i in range(options['products'])
+            )
+            user = User.objects.create_user(username='bench-render')
+            user.balance = user.wallet
+            request = RequestFactory().get('/product_list/')
+            request.user = user
+            context = {'products': list(with_available_stock(Product.objects.order_by('pk')))}
+
+            caches['template_fragments'].clear()
+            cases = (
+                ('no fragment cache', uncached, options['repeat']),
+                ('fragment cache cold', template, 1),
+                ('fragment cache warm', template, options['repeat']),
+            )
+            for name, case_template, repeat in cases:
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    case_template.render(context, request)
+                elapsed = (time.perf_counter() - start) / repeat
+                self.stdout.write(f'{name:>20}: {elapsed * 1000:8.1f} ms per render of {options["products"]} products')
+
+            transaction.set_rollback(True)
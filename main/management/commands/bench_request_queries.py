@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from main.models import Product, User
+
+PASSWORD = 'bench-Passw0rd!'
+
+
+class Command(BaseCommand):
+    help = 'Print queries per request for the catalog, login and registration under the current settings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3, help='Requests per case; later ones show warm caches.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'SESSION_ENGINE={settings.SESSION_ENGINE}')
+        self.stdout.write(f'AUTHENTICATION_BACKENDS={settings.AUTHENTICATION_BACKENDS}')
+
+        with transaction.atomic():
+            Product.objects.create(name='Bench product', description='Benchmark', stock=10)
+            User.objects.create_user(username='bench-queries', password=PASSWORD)
+            anonymous, member = Client(HTTP_HOST='localhost'), Client(HTTP_HOST='localhost')
+
+            cases = [
+                ('ProductList (anonymous)', lambda i: anonymous.get(reverse('product_list'))),
+                ('Login', lambda i: member.post(reverse('login'), {'username': 'bench-queries', 'password': PASSWORD})),
+                ('ProductList (logged in)', lambda i: member.get(reverse('product_list'))),
+                ('Register', lambda i: Client(HTTP_HOST='localhost').post(reverse('registration'), {
+                    'username': f'bench-register-{i}', 'password1': PASSWORD, 'password2': PASSWORD,
+                })),
+            ]
+            for name, request in cases:
+                counts = []
+                for i in range(options['repeat']):
+                    with CaptureQueriesContext(connection) as queries:
+                        request(i)
+                    counts.append(len(queries))
+                self.stdout.write(f'{name:>24}: {counts} queries')
+
+            transaction.set_rollback(True)
@@ -0,0 +1,74 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+from django.db.models import Sum
+
+from main.checkout import CheckoutError, buy_product
+from main.retry import conflicts
+from main.models import Product, Purchase, Reservation, User
+from main.reservations import confirm, reserve
+from main.stock import split_stock, with_available_stock
+
+
+def reserve_and_confirm(user, product_id, quantity):
+    return confirm(user, reserve(user, product_id, quantity).pk)
+
+
+class Command(BaseCommand):
+    help = 'Drop one hot product on many threads: direct checkout on one row against sharded reserve + confirm.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--attempts', type=int, default=50, help='Purchase attempts per thread.')
+        parser.add_argument('--stock', type=int, default=500)
+        parser.add_argument('--shards', type=int, default=8)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'database={connection.vendor}')
+        self.run('hot row', buy_product, None, options)
+        self.run(f"{options['shards']} shards", reserve_and_confirm, options['shards'], options)
+
+    def run(self, name, buy, shards, options):
+        product = Product.objects.create(name='Drop product', description='Benchmark', price=1, stock=options['stock'])
+        if shards:
+            split_stock(product.pk, shards)
+        users = [
+            User.objects.create(username=f'bench-drop-{i}', wallet=10 ** 6) for i in range(options['threads'])
+        ]
+        results = {'ok': 0, 'rejected': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def worker(user):
+            for _ in range(options['attempts']):
+                try:
+                    buy(user, product.pk, 1)
+                    outcome = 'ok'
+                except CheckoutError:
+                    outcome = 'rejected'
+                except DatabaseError:
+                    outcome = 'errors'
+                with lock:
+                    results[outcome] += 1
+            connection.close()
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        sold = Purchase.objects.filter(product=product).aggregate(total=Sum('quantity'))['total'] or 0
+        left = with_available_stock(Product.objects.filter(pk=product.pk)).values_list('available_stock', flat=True).get()
+        held = Reservation.objects.filter(product=product).aggregate(total=Sum('quantity'))['total'] or 0
+        self.stdout.write(
+            f"{name:>10}: {results['ok'] / elapsed:.1f} checkouts/s, ok={results['ok']} "
+            f"rejected={results['rejected']} errors={results['errors']} sold={sold} left={left} held={held} "
+            f"oversold={sold + left + held - options['stock']} conflicts/s={conflicts.per_second():.2f}"
+        )
+
+        product.delete()
+        User.objects.filter(pk__in=[user.pk for user in users]).delete()
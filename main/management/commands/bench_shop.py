@@ -0,0 +1,142 @@
+import json
+import random
+import subprocess
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from main.loadtest import run_client_load
+from main.models import Refund, User
+from main.seed import clear_seed, seed_shop, seeded_products, seeded_users
+
+CASES = ('home', 'buy_product', 'purchase_list', 'refunds', 'refund_agree')
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Seed a shop and drive the main URLs through the test client, sequentially and concurrently.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cases', default=','.join(CASES), help=f'Comma separated: {", ".join(CASES)}.')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per case and mode.')
+        parser.add_argument('--concurrency', type=int, default=8, help='Workers for the concurrent mode; 1 skips it.')
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--products', type=int, default=200)
+        parser.add_argument('--purchases', type=int, default=5000)
+        parser.add_argument('--refunds', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--compare', help='JSON results of an earlier run to print deltas against.')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded data afterwards.')
+
+    def handle(self, *args, **options):
+        cases = options['cases'].split(',')
+        for name in cases:
+            if name not in CASES:
+                raise CommandError(f'Unknown case {name}.')
+        modes = {'sequential': 1}
+        if options['concurrency'] > 1:
+            modes['concurrent'] = options['concurrency']
+
+        prefix = options['prefix']
+        clear_seed(prefix)
+        counts = seed_shop(options['users'], options['products'], options['purchases'], options['refunds'],
+                           prefix=prefix, seed=options['seed'])
+        try:
+            results = self.run_cases(cases, modes, options)
+        finally:
+            if not options['keep']:
+                clear_seed(prefix)
+
+        report = {
+            'commit': git_commit(),
+            'time': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'async_views': settings.ASYNC_VIEWS,
+            'seed': counts,
+            'requests': options['requests'],
+            'results': results,
+        }
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)['results']
+
+        for name, by_mode in results.items():
+            for mode, stats in by_mode.items():
+                line = (
+                    f"{name:>14} {mode:>10}: {stats['rps']:8.1f} req/s  p50 {stats['p50_ms']:6.1f} ms  "
+                    f"p95 {stats['p95_ms']:6.1f} ms  p99 {stats['p99_ms']:6.1f} ms  "
+                    f"{stats['queries_per_request']:.1f} queries/req  errors {stats['errors']}"
+                )
+                before = (baseline or {}).get(name, {}).get(mode)
+                if before and before['rps']:
+                    line += f"  rps {stats['rps'] / before['rps'] - 1:+.0%} p95 {stats['p95_ms'] - before['p95_ms']:+.1f} ms"
+                self.stdout.write(line)
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
+
+    def run_cases(self, cases, modes, options):
+        prefix = options['prefix']
+        user_ids = list(seeded_users(prefix).order_by('pk').values_list('pk', flat=True))
+        product_ids = list(seeded_products(prefix).values_list('pk', flat=True))
+        staff = User.objects.create_user(username=f'{prefix}-user-staff', is_staff=True)
+        rng = random.Random(options['seed'])
+
+        def anonymous(worker):
+            return Client(HTTP_HOST='localhost', raise_request_exception=False)
+
+        def member(worker):
+            client = Client(HTTP_HOST='localhost', raise_request_exception=False)
+            client.force_login(User.objects.get(pk=user_ids[worker % len(user_ids)]))
+            return client
+
+        def admin(worker):
+            client = Client(HTTP_HOST='localhost', raise_request_exception=False)
+            client.force_login(staff)
+            return client
+
+        pending = Refund.objects.filter(refund_purchase__user_id__in=user_ids).order_by('pk')
+        refund_ids = iter(list(pending.values_list('pk', flat=True)))
+        lock = threading.Lock()
+
+        def agree(client, i):
+            with lock:
+                refund_id = next(refund_ids)
+            return client.post(reverse('refund_agree', args=[refund_id]), {'action': 'agree'})
+
+        drivers = {
+            'home': (anonymous, lambda client, i: client.get(reverse('home'))),
+            'buy_product': (member, lambda client, i: client.post(
+                reverse('buy_product', args=[rng.choice(product_ids)]), {'quantity': 1})),
+            'purchase_list': (member, lambda client, i: client.get(reverse('purchase_list'))),
+            'refunds': (admin, lambda client, i: client.get(reverse('refunds'))),
+            'refund_agree': (admin, agree),
+        }
+
+        results = {}
+        for name in cases:
+            make_client, request = drivers[name]
+            results[name] = {}
+            for mode, concurrency in modes.items():
+                total = options['requests']
+                if name == 'refund_agree':
+                    total = min(total, pending.count())
+                results[name][mode] = run_client_load(request, concurrency, total, make_client)
+        return results
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main.bulk import batched
+from main.models import WalletTransaction
+from main.wallet import compact
+
+
+class Command(BaseCommand):
+    help = 'Fold wallet ledger entries into per-user balance snapshots in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--prune-days', type=int, help='Also delete folded entries older than N days.')
+
+    def handle(self, *args, **options):
+        prune_before = None
+        if options['prune_days'] is not None:
+            prune_before = timezone.now() - timedelta(days=options['prune_days'])
+
+        user_ids = WalletTransaction.objects.values_list('user_id', flat=True).distinct().order_by('user_id')
+        folded = 0
+        for batch in batched(user_ids.iterator(), options['batch_size']):
+            folded += compact(batch, prune_before)
+        self.stdout.write(self.style.SUCCESS(f'Snapshotted {folded} wallets.'))
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.refunds import CHUNK_SIZE, expire_refunds
+
+
+class Command(BaseCommand):
+    help = 'Reject pending refunds left unreviewed past the review period, in chunked transactions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        expired = expire_refunds(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Expired {expired} refunds pending for more than {settings.REFUND_REVIEW_DAYS} days.'
+        ))
@@ -0,0 +1,38 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from main.imports import BATCH_SIZE, import_products, read_rows
+
+FORMATS = {'.csv': 'csv', '.json': 'json', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+
+class Command(BaseCommand):
+    help = 'Validate and upsert products by SKU from a CSV, NDJSON or JSON feed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=sorted(set(FORMATS.values())),
+                            help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Validate only, do not write.')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or FORMATS.get(path.suffix.lower(), 'csv')
+
+        imported = rejected = 0
+        with path.open(encoding='utf-8-sig', newline='') as file:
+            rows = read_rows(file, file_format)
+            for report in import_products(rows, options['batch_size'], options['dry_run']):
+                imported += report['imported']
+                rejected += len(report['rejected'])
+                self.stdout.write(
+                    f"Batch {report['batch']}: {report['imported']}/{report['rows']} rows "
+                    f"in {report['seconds']:.2f}s ({report['rows_per_second']:.0f} rows/s)"
+                )
+                for line, errors in report['rejected']:
+                    self.stderr.write(f'  line {line} rejected: {errors}')
+
+        action = 'validated' if options['dry_run'] else 'imported'
+        self.stdout.write(self.style.SUCCESS(f'{imported} products {action}, {rejected} rows rejected.'))
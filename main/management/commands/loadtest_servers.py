@@ -0,0 +1,65 @@
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.loadtest import run_http_load
+
+SERVERS = {
+    'wsgi': ['gunicorn', 'myshop.wsgi:application', '--workers', '1', '--threads', '{threads}', '--bind',
+             '127.0.0.1:{port}'],
+    'wsgi-dev': [sys.executable, 'manage.py', 'runserver', '--noreload', '--nothreading', '127.0.0.1:{port}'],
+    'uvicorn': [sys.executable, '-m', 'uvicorn', 'myshop.asgi:application', '--port', '{port}', '--log-level',
+                'warning'],
+    'daphne': [sys.executable, '-m', 'daphne', '-p', '{port}', 'myshop.asgi:application'],
+}
+MODULES = {'wsgi': 'gunicorn', 'uvicorn': 'uvicorn', 'daphne': 'daphne'}
+
+
+def wait_for_port(port, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.1)
+    raise CommandError(f'Server on port {port} did not start.')
+
+
+class Command(BaseCommand):
+    help = 'Start WSGI and ASGI servers locally and compare throughput and latency percentiles on read paths.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', default='wsgi,uvicorn', help=f'Comma separated: {", ".join(SERVERS)}.')
+        parser.add_argument('--paths', default='/,/product_list/,/api/products/')
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        paths = options['paths'].split(',')
+        for name in options['servers'].split(','):
+            if name not in SERVERS:
+                raise CommandError(f'Unknown server {name}.')
+            if name in MODULES and importlib.util.find_spec(MODULES[name]) is None:
+                raise CommandError(f'{name} needs the {MODULES[name]} package: pip install {MODULES[name]}')
+
+            env = dict(os.environ, SHOP_ASYNC_VIEWS='1' if name in ('uvicorn', 'daphne') else '0')
+            command = [part.format(port=options['port'], threads=options['concurrency']) for part in SERVERS[name]]
+            server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                wait_for_port(options['port'])
+                stats = run_http_load(f"http://127.0.0.1:{options['port']}", paths, options['concurrency'],
+                                      options['requests'])
+            finally:
+                server.terminate()
+                server.wait()
+
+            self.stdout.write(
+                f"{name:>9}: {stats['rps']:8.1f} req/s  p50 {stats['p50_ms']:.1f} ms  p95 {stats['p95_ms']:.1f} ms  "
+                f"p99 {stats['p99_ms']:.1f} ms  errors {stats['errors']}"
+            )
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.models import Refund
+from main.refunds import CHUNK_SIZE, approve_refunds, reject_refunds
+
+
+class Command(BaseCommand):
+    help = 'Approve or reject pending refunds in chunked transactions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['approve', 'reject'])
+        parser.add_argument('--ids', type=int, nargs='*', help='Only process these refunds (default: all pending).')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        refund_ids = options['ids'] or Refund.objects.order_by('pk').values_list('pk', flat=True)
+        process = approve_refunds if options['action'] == 'approve' else reject_refunds
+
+        start = time.perf_counter()
+        processed = process(refund_ids, chunk_size=options['chunk_size'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['action'].capitalize()}: {processed} refunds in {elapsed:.2f}s ({processed / max(elapsed, 1e-9):.0f}/s)."
+        ))
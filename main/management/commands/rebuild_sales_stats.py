@@ -0,0 +1,64 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from main.jobs import drain
+from main.models import DailySales, Job, ProductSales, Purchase, PurchaseArchive
+
+SALE_FIELDS = ('product_id', 'quantity', 'unit_price', 'product__price', 'purchase_time')
+STATS_TASKS = ('update_sales_stats', 'update_refund_stats')
+
+
+class Command(BaseCommand):
+    help = 'Recompute units sold and revenue counters from purchases and report drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--dry-run', action='store_true', help='Only report drift, do not write counters.')
+        parser.add_argument('--drain', action='store_true', help='Run queued jobs first instead of refusing.')
+
+    def handle(self, *args, **options):
+        # Queued stats jobs have not reached the counters yet: the rebuild would count their purchases and the
+        # jobs would add them again on top.
+        if options['drain']:
+            drain()
+        pending = Job.objects.filter(name__in=STATS_TASKS, status=Job.PENDING).count()
+        if pending:
+            raise CommandError(f'{pending} sales stats jobs are still queued; run with --drain or wait for workers.')
+
+        products = defaultdict(lambda: [0, Decimal(0)])
+        days = defaultdict(lambda: [0, Decimal(0)])
+        for model in (Purchase, PurchaseArchive):
+            rows = model.objects.values_list(*SALE_FIELDS).iterator(chunk_size=options['chunk_size'])
+            for product_id, quantity, unit_price, price, purchase_time in rows:
+                amount = (price if unit_price is None else unit_price) * quantity
+                for totals in (products[product_id], days[timezone.localdate(purchase_time)]):
+                    totals[0] += quantity
+                    totals[1] += amount
+
+        product_drift = self.rebuild(ProductSales, products, options)
+        day_drift = self.rebuild(DailySales, days, options)
+        self.stdout.write(f'Drift: {product_drift} product counters, {day_drift} daily counters.')
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS('Sales counters rebuilt.'))
+
+    def rebuild(self, model, totals, options):
+        stored = {pk: (units, revenue) for pk, units, revenue in
+                  model.objects.values_list('pk', 'units_sold', 'revenue').iterator(chunk_size=options['chunk_size'])}
+        for pk in stored:
+            totals.setdefault(pk, [0, Decimal(0)])
+        changed = {pk: values for pk, values in totals.items() if tuple(values) != stored.get(pk)}
+
+        if not options['dry_run'] and changed:
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    [model(pk=pk, units_sold=units, revenue=revenue) for pk, (units, revenue) in changed.items()],
+                    batch_size=options['chunk_size'],
+                    update_conflicts=True,
+                    unique_fields=[model._meta.pk.name],
+                    update_fields=['units_sold', 'revenue'],
+                )
+        return len(changed)
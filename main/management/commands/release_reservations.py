@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Return the stock of expired reservations, once or every --interval seconds.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=float, help='Keep sweeping, sleeping this many seconds between runs.')
+
+    def handle(self, *args, **options):
+        while True:
+            released = 0
+            while batch := release_expired(batch_size=options['batch_size']):
+                released += batch
+            self.stdout.write(f'Released {released} expired reservations.')
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
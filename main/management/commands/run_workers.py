@@ -0,0 +1,58 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from main.jobs import BATCH_SIZE, WorkerStats, queue_stats, work
+
+
+def worker_loop(batch_size, idle_sleep, drain, report_every):
+    stats = WorkerStats()
+    reported = time.monotonic()
+    try:
+        while True:
+            if not work(batch_size, stats):
+                if drain:
+                    return stats.summary()
+                time.sleep(idle_sleep)
+            if report_every and time.monotonic() - reported >= report_every:
+                reported = time.monotonic()
+                print(format_stats(multiprocessing.current_process().name, stats.summary()), flush=True)
+    finally:
+        connections.close_all()
+
+
+def format_stats(name, stats):
+    return (
+        f"{name}: {stats['done']} done, {stats['failed']} failed, {stats['jobs_per_second']:.1f} jobs/s, "
+        f"lag p50 {stats['lag_p50_s']:.2f}s p95 {stats['lag_p95_s']:.2f}s"
+    )
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs in a pool of worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count())
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--idle-sleep', type=float, default=0.5, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--drain', action='store_true', help='Exit once the queue is empty.')
+        parser.add_argument('--report-every', type=float, default=30, help='Seconds between worker stat lines.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Queue before: {queue_stats()}")
+        # Forked workers must open their own database connections.
+        connections.close_all()
+        args = (options['batch_size'], options['idle_sleep'], options['drain'], options['report_every'])
+        with ProcessPoolExecutor(options['processes'], mp_context=multiprocessing.get_context('fork')) as pool:
+            futures = [pool.submit(worker_loop, *args) for _ in range(options['processes'])]
+            results = [future.result() for future in futures]
+
+        for index, stats in enumerate(results):
+            self.stdout.write(format_stats(f'worker {index}', stats))
+        self.stdout.write(self.style.SUCCESS(
+            f"Ran {sum(stats['done'] for stats in results)} jobs, {sum(stats['failed'] for stats in results)} failed. "
+            f"Queue after: {queue_stats()}"
+        ))
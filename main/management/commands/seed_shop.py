@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.seed import PASSWORD, clear_seed, seed_shop
+
+
+class Command(BaseCommand):
+    help = 'Generate users, products, purchases and refunds with bulk inserts for benchmarks and local testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--purchases', type=int, default=10000)
+        parser.add_argument('--refunds', type=int, default=500)
+        parser.add_argument('--prefix', default='seed', help='Prefix of seeded usernames and SKUs.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; equal seeds give equal data.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--clear', action='store_true', help='Delete earlier data with the same prefix first.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        with transaction.atomic():
+            if options['clear']:
+                clear_seed(options['prefix'])
+            counts = seed_shop(
+                options['users'], options['products'], options['purchases'], options['refunds'],
+                prefix=options['prefix'], seed=options['seed'], batch_size=options['batch_size'],
+            )
+        summary = ', '.join(f'{count} {name}' for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {summary} in {time.perf_counter() - start:.1f}s. Users log in with password {PASSWORD!r}.'
+        ))
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.models import Product
+from main.stock import merge_stock, split_stock
+
+
+class Command(BaseCommand):
+    help = "Split hot products' stock into shard counters before a drop, or merge them back afterwards."
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_ids', type=int, nargs='+')
+        parser.add_argument('--shards', type=int, default=settings.STOCK_SHARDS)
+        parser.add_argument('--merge', action='store_true')
+
+    def handle(self, *args, **options):
+        for product_id in options['product_ids']:
+            try:
+                if options['merge']:
+                    merge_stock(product_id)
+                else:
+                    split_stock(product_id, options['shards'])
+            except Product.DoesNotExist:
+                raise CommandError(f'Product {product_id} does not exist.')
+        action = 'Merged' if options['merge'] else f"Split into {options['shards']} shards:"
+        self.stdout.write(self.style.SUCCESS(f"{action} {len(options['product_ids'])} products."))
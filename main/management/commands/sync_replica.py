@@ -0,0 +1,33 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from main.routers import REPLICA, replica_configured
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database into the replica file, standing in for replication when testing locally.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Keep copying every N seconds to simulate replica lag.')
+
+    def handle(self, *args, **options):
+        if not replica_configured():
+            raise CommandError('No replica configured; set SHOP_DB_REPLICA to the replica file.')
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('Only SQLite replicas are synced by hand; Postgres standbys use streaming replication.')
+
+        while True:
+            primary = connections['default']
+            primary.ensure_connection()
+            replica = sqlite3.connect(connections[REPLICA].settings_dict['NAME'])
+            try:
+                primary.connection.backup(replica)
+            finally:
+                replica.close()
+            self.stdout.write(f'Replica synced at {time.strftime("%H:%M:%S")}.')
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,153 @@
+import functools
+import logging
+import threading
+import time
+import traceback
+from collections import defaultdict, deque
+from contextvars import ContextVar
+
+from django.conf import settings
+
+slow_query_logger = logging.getLogger('main.slow_queries')
+
+# The timer of the request being served. Context variables follow the request into sync_to_async threads, so
+# queries made there and on any database alias reach the same timer.
+current_timer = ContextVar('current_timer', default=None)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class RollingHistogram:
+    """Keeps the last ``window`` samples per key, plus lifetime counts and sums, for quantile export."""
+
+    def __init__(self, window):
+        self.window = window
+        self.samples = defaultdict(lambda: deque(maxlen=self.window))
+        self.counts = defaultdict(int)
+        self.sums = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def observe(self, key, value):
+        with self.lock:
+            self.samples[key].append(value)
+            self.counts[key] += 1
+            self.sums[key] += value
+
+    def snapshot(self):
+        with self.lock:
+            return {key: (list(samples), self.counts[key], self.sums[key]) for key, samples in self.samples.items()}
+
+
+class RequestMetrics:
+    def __init__(self, window=1000):
+        self.wall = RollingHistogram(window)
+        self.db_time = RollingHistogram(window)
+        self.queries = RollingHistogram(window)
+        self.template = RollingHistogram(window)
+
+    def observe(self, view, timer):
+        self.wall.observe(view, timer.wall)
+        self.db_time.observe(view, timer.db_time)
+        self.queries.observe(view, timer.queries)
+        self.template.observe(view, timer.template_time)
+
+
+request_metrics = RequestMetrics(settings.REQUEST_METRICS_WINDOW)
+
+
+class RequestTimer:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.wall = 0.0
+        self.db_time = 0.0
+        self.queries = 0
+        self.template_time = 0.0
+        self.rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.db_time += elapsed
+            self.queries += 1
+            if elapsed * 1000 >= settings.SLOW_QUERY_MS:
+                slow_query_logger.warning(
+                    'Slow query (%.1f ms): %s\n%s', elapsed * 1000, sql, ''.join(traceback.format_stack(limit=15)),
+                )
+
+    def server_timing(self):
+        return (
+            f'app;dur={self.wall * 1000:.1f}, '
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries", '
+            f'tpl;dur={self.template_time * 1000:.1f}'
+        )
+
+
+def timed_execute(execute, sql, params, many, context):
+    timer = current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+def install_timer(sender, connection, **kwargs):
+    """``connection_created`` receiver: every connection, on every alias and thread, reports to the request timer."""
+    if timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(timed_execute)
+
+
+def timed_render(render):
+    """Wrap a template backend's ``render`` so the outermost render of each request adds to its template time."""
+
+    @functools.wraps(render)
+    def wrapper(template, context=None, request=None):
+        timer = current_timer.get()
+        if timer is None or timer.rendering:
+            return render(template, context, request)
+        timer.rendering = True
+        start = time.perf_counter()
+        try:
+            return render(template, context, request)
+        finally:
+            timer.template_time += time.perf_counter() - start
+            timer.rendering = False
+
+    wrapper.timed = True
+    return wrapper
+
+
+def install_template_timer():
+    """Time every Django template render, whether it comes from render(), render_to_string or a TemplateResponse."""
+    from django.template.backends.django import Template
+
+    if not getattr(Template.render, 'timed', False):
+        Template.render = timed_render(Template.render)
+
+
+def prometheus_text(extra_gauges=()):
+    lines = []
+    histograms = (
+        ('shop_request_duration_seconds', 'Wall time per request.', request_metrics.wall),
+        ('shop_request_db_seconds', 'Database time per request.', request_metrics.db_time),
+        ('shop_request_queries', 'Database queries per request.', request_metrics.queries),
+        ('shop_request_template_seconds', 'Template render time per request.', request_metrics.template),
+    )
+    for name, help_text, histogram in histograms:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} summary']
+        for view, (samples, count, total) in sorted(histogram.snapshot().items()):
+            for quantile in QUANTILES:
+                lines.append(f'{name}{{view="{view}",quantile="{quantile}"}} {percentile(samples, quantile):.6f}')
+            lines.append(f'{name}_sum{{view="{view}"}} {total:.6f}')
+            lines.append(f'{name}_count{{view="{view}"}} {count}')
+    for name, help_text, value in extra_gauges:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value:.6f}']
+    return '\n'.join(lines) + '\n'
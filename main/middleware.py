@@ -0,0 +1,133 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import routers
+from .metrics import RequestTimer, current_timer, request_metrics
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RequestTimingMiddleware:
+    """Records wall, DB and template time per URL name and reports them in a Server-Timing header."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.timer = RequestTimer()
+        token = current_timer.set(request.timer)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        request.timer = RequestTimer()
+        token = current_timer.set(request.timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        return self.finish(request, response)
+
+    def finish(self, request, response):
+        timer = request.timer
+        timer.wall = time.perf_counter() - timer.start
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        if response.streaming:
+            # Streamed bodies run their queries after the view returns. The header can only cover the time until
+            # then, so the timer follows the chunks and the metrics wait for the last one.
+            stream = self.atimed_stream if response.is_async else self.timed_stream
+            response.streaming_content = stream(view, timer, response.streaming_content)
+        else:
+            request_metrics.observe(view, timer)
+        response['Server-Timing'] = timer.server_timing()
+        return response
+
+    def observe(self, view, timer):
+        timer.wall = time.perf_counter() - timer.start
+        request_metrics.observe(view, timer)
+
+    def timed_stream(self, view, timer, chunks):
+        try:
+            while True:
+                token = current_timer.set(timer)
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    return
+                finally:
+                    current_timer.reset(token)
+                yield chunk
+        finally:
+            self.observe(view, timer)
+
+    async def atimed_stream(self, view, timer, chunks):
+        try:
+            while True:
+                token = current_timer.set(timer)
+                try:
+                    chunk = await anext(chunks)
+                except StopAsyncIteration:
+                    return
+                finally:
+                    current_timer.reset(token)
+                yield chunk
+        finally:
+            self.observe(view, timer)
+
+
+class ReplicaRoutingMiddleware:
+    """Routes GETs of views marked ``replica_reads`` to the replica, unless the client wrote recently.
+
+    A write pins the client to the primary for REPLICA_STICKY_SECONDS through a cookie, so it reads its own
+    writes while the replica catches up.
+    """
+
+    sync_capable = True
+    async_capable = True
+    cookie_name = 'shop_primary_until'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.db_routing = routers.start_request(self.is_pinned(request))
+        return self.finish(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        request.db_routing = routers.start_request(self.is_pinned(request))
+        return self.finish(request, await self.get_response(request))
+
+    def is_pinned(self, request):
+        try:
+            return float(request.COOKIES.get(self.cookie_name, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        if request.method in SAFE_METHODS and getattr(view_class, 'replica_reads', False):
+            request.db_routing.replica = True
+
+    def finish(self, request, response):
+        if routers.replica_configured() and (request.db_routing.wrote or request.method not in SAFE_METHODS):
+            sticky = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(self.cookie_name, str(time.time() + sticky), max_age=sticky, httponly=True,
+                                samesite='Lax')
+        return response
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute('CREATE VIRTUAL TABLE main_product_fts USING fts5(name, description)')
+        schema_editor.execute(
+            'INSERT INTO main_product_fts (rowid, name, description) SELECT id, name, description FROM main_product'
+        )
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX main_product_search_idx ON main_product "
+            "USING GIN (to_tsvector('english', name || ' ' || description))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS main_product_fts')
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS main_product_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_rename_quantiti_purchase_quantity'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
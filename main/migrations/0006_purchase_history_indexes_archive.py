@@ -0,0 +1,45 @@
+# Generated by Django 4.2.6 on 2026-10-18 18:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurchaseArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.PositiveIntegerField()),
+                ('purchase_time', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['user', 'purchase_time'], name='purchase_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['purchase_time'], name='purchase_time_idx'),
+        ),
+        migrations.AddField(
+            model_name='purchasearchive',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.product'),
+        ),
+        migrations.AddField(
+            model_name='purchasearchive',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_purchases', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='purchasearchive',
+            index=models.Index(fields=['user', 'purchase_time'], name='archive_user_time_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.6 on 2026-10-18 18:55
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_refundable_until(apps, schema_editor):
+    Purchase = apps.get_model('main', 'Purchase')
+    Purchase.objects.update(refundable_until=F('purchase_time') + timedelta(seconds=settings.REFUND_WINDOW_SECONDS))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchase',
+            name='refundable_until',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(backfill_refundable_until, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_purchase_refundable_until'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='refund',
+            name='refund_time',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:04
+
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_demand_score(apps, schema_editor):
+    Purchase = apps.get_model('main', 'Purchase')
+    ProductSales = apps.get_model('main', 'ProductSales')
+    epoch = apps.get_model('main', 'DemandEpoch').objects.create(pk=1, epoch=datetime.now(timezone.utc)).epoch
+    period = timedelta(days=settings.VELOCITY_DAYS)
+    # Older sales weigh less than e**-10 of a current one.
+    since = epoch - 10 * period
+    scores = defaultdict(float)
+    purchases = Purchase.objects.filter(purchase_time__gte=since).values_list('product_id', 'quantity', 'purchase_time')
+    for product_id, quantity, purchase_time in purchases.iterator():
+        scores[product_id] += quantity * math.exp((purchase_time - epoch) / period)
+    ProductSales.objects.bulk_create([ProductSales(pk=pk) for pk in scores], ignore_conflicts=True)
+    ProductSales.objects.bulk_update(
+        [ProductSales(pk=pk, demand_score=score) for pk, score in scores.items()], ['demand_score'], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_refund_time_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandEpoch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('epoch', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockForecast',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='forecast', serialize=False, to='main.product')),
+                ('velocity', models.FloatField(default=0)),
+                ('reorder_point', models.PositiveIntegerField(default=0)),
+                ('stockout_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='productsales',
+            name='demand_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(backfill_demand_score, migrations.RunPython.noop),
+    ]
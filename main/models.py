@@ -1,16 +1,34 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.functional import cached_property
 
 
 class User(AbstractUser):
+    # Balance as of the last folded ledger entry; the live balance adds newer WalletTransaction rows.
     wallet = models.DecimalField(max_digits=10, decimal_places=2, default=10000)
+    wallet_snapshot_id = models.BigIntegerField(default=0)
+    wallet_snapshot_time = models.DateTimeField(null=True, blank=True)
+
+    @cached_property
+    def balance(self):
+        delta = self.wallet_transactions.filter(pk__gt=self.wallet_snapshot_id).aggregate(total=Sum('amount'))
+        return self.wallet + (delta['total'] or 0)
 
 
 class Product(models.Model):
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=255)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2, default=100)
     stock = models.PositiveIntegerField()
+    # Versions the cached product fragment; bulk stock updates skip it, so stock stays outside that fragment.
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -20,15 +38,178 @@ class Purchase(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_purchases')
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='user_products')
     quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     purchase_time = models.DateTimeField(auto_now_add=True)
+    # End of the refund window, fixed at purchase time; bulk inserts must set it themselves.
+    refundable_until = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'purchase_time'], name='purchase_user_time_idx'),
+            models.Index(fields=['purchase_time'], name='purchase_time_idx'),
+        ]
+
+    @staticmethod
+    def refund_deadline():
+        return timezone.now() + timedelta(seconds=settings.REFUND_WINDOW_SECONDS)
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.refundable_until is None:
+            self.refundable_until = self.refund_deadline()
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.user.username}'s purchase"
 
 
+class PurchaseArchive(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_purchases', db_index=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    purchase_time = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'purchase_time'], name='archive_user_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived purchase {self.id}"
+
+
 class Refund(models.Model):
     refund_purchase = models.OneToOneField(Purchase, on_delete=models.CASCADE)
-    refund_time = models.DateTimeField(auto_now_add=True)
+    refund_time = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Refund for purchase {self.refund_purchase_id}"
+
+
+class ProductSales(models.Model):
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='sales')
+    units_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    refunded_units = models.IntegerField(default=0)
+    refunded_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Forward-decayed units sold; forecast.velocity() turns it into units per day without rescanning purchases.
+    demand_score = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-units_sold'], name='sales_units_idx'),
+            models.Index(fields=['-revenue'], name='sales_revenue_idx'),
+        ]
+
+    def __str__(self):
+        return f"Sales of {self.product_id}"
+
+
+class DemandEpoch(models.Model):
+    # Single row: the landmark ProductSales.demand_score weights are relative to; forecast.rebase_demand moves it.
+    epoch = models.DateTimeField()
+
+    def __str__(self):
+        return f"Demand epoch {self.epoch}"
+
+
+class StockForecast(models.Model):
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='forecast')
+    velocity = models.FloatField(default=0)
+    reorder_point = models.PositiveIntegerField(default=0)
+    stockout_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Forecast for {self.product_id}"
+
+
+class DailySales(models.Model):
+    day = models.DateField(primary_key=True)
+    units_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    refunded_units = models.IntegerField(default=0)
+    refunded_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"Sales on {self.day}"
+
+
+class WalletTransaction(models.Model):
+    PURCHASE = 'purchase'
+    REFUND = 'refund'
+    TOP_UP = 'top_up'
+    KIND_CHOICES = [
+        (PURCHASE, 'Purchase'),
+        (REFUND, 'Refund'),
+        (TOP_UP, 'Top-up'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='wallet_transactions', db_index=False)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='wallet_tx_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} of {self.amount} for user {self.user_id}"
+
+
+class StockShard(models.Model):
+    # A slice of a hot product's stock; buyers spread their decrements over the shards instead of one row.
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_shards')
+    index = models.PositiveSmallIntegerField()
+    stock = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'index'], name='stock_shard_unique'),
+        ]
+
+    def __str__(self):
+        return f"Shard {self.index} of product {self.product_id}"
+
+
+class Reservation(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    # The shard the units were taken from, or null when they came from Product.stock.
+    shard = models.ForeignKey(StockShard, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Hold of {self.quantity} x {self.product_id} for user {self.user_id}"
+
+
+class Job(models.Model):
+    PENDING = 'pending'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    # A worker's lease; jobs of a crashed worker become claimable again once it passes.
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_ready_idx'),
+        ]
 
     def __str__(self):
-        return f"Refund for purchase {self.refund_purchase.id}"
+        return f"{self.name} job {self.pk}"
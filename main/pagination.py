@@ -0,0 +1,124 @@
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connection, connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+ESTIMATE_THRESHOLD = 10000
+
+
+def estimated_count(queryset):
+    """Cheap row estimate for the queryset's whole table, or None when the backend offers none."""
+    model = queryset.model
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+            row = cursor.fetchone()
+            # Tables that were never vacuumed or analyzed report -1.
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor != 'sqlite':
+            return None
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+        if cursor.fetchone():
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [model._meta.db_table])
+            row = cursor.fetchone()
+            if row:
+                return int(row[0].split()[0])
+    # Without ANALYZE statistics the primary key span is two index probes and close enough for a page count.
+    pks = model._default_manager.using(queryset.db).order_by().values_list('pk', flat=True)
+    first, last = pks.order_by('pk').first(), pks.order_by('-pk').first()
+    return 0 if first is None else last - first + 1
+
+
+class EstimatedCountPaginator(Paginator):
+    """Uses the table estimate instead of COUNT(*) for unfiltered querysets over large tables."""
+    exact_below = ESTIMATE_THRESHOLD
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where and not query.distinct and query.combinator is None:
+            estimate = estimated_count(self.object_list)
+            if estimate is not None and estimate >= self.exact_below:
+                return estimate
+        return super().count
+
+
+class KeysetPaginationMixin:
+    page_size = 20
+    cursor_param = 'after'
+    cursor_separator = '_'
+    keyset_fields = ('pk',)
+    keyset_descending = False
+
+    def get_keyset_field(self, name):
+        opts = self.model._meta
+        return opts.pk if name == 'pk' else opts.get_field(name)
+
+    def get_cursor(self):
+        raw = self.request.GET.get(self.cursor_param, '')
+        parts = raw.split(self.cursor_separator)
+        if not raw or len(parts) != len(self.keyset_fields):
+            return None
+        try:
+            return tuple(self.parse_cursor_part(name, part) for name, part in zip(self.keyset_fields, parts))
+        except (ValidationError, OverflowError):
+            return None
+
+    def parse_cursor_part(self, name, part):
+        field = self.get_keyset_field(name)
+        value = field.to_python(part)
+        # Out of range integers pass to_python but overflow in the database driver.
+        low, high = connection.ops.integer_field_ranges.get(field.get_internal_type(), (None, None))
+        if value is not None and (low is not None and value < low or high is not None and value > high):
+            raise ValidationError('Cursor out of range.')
+        return value
+
+    def encode_cursor(self, row):
+        values = (getattr(row, name) for name in self.keyset_fields)
+        return self.cursor_separator.join(
+            value.isoformat() if hasattr(value, 'isoformat') else str(value) for value in values
+        )
+
+    def keyset_filter(self, cursor):
+        lookup = 'lt' if self.keyset_descending else 'gt'
+        condition = Q()
+        for i, name in enumerate(self.keyset_fields):
+            equal = dict(zip(self.keyset_fields[:i], cursor[:i]))
+            condition |= Q(**equal, **{f'{name}__{lookup}': cursor[i]})
+        return condition
+
+    def keyset_page_queryset(self, queryset):
+        cursor = self.get_cursor()
+        prefix = '-' if self.keyset_descending else ''
+        queryset = queryset.order_by(*(prefix + name for name in self.keyset_fields))
+        if cursor is not None:
+            queryset = queryset.filter(self.keyset_filter(cursor))
+        return queryset[:self.page_size + 1]
+
+    def split_keyset_page(self, rows):
+        if len(rows) <= self.page_size:
+            return rows, None
+        rows = rows[:self.page_size]
+        return rows, self.encode_cursor(rows[-1])
+
+    def paginate_keyset(self, queryset):
+        return self.split_keyset_page(list(self.keyset_page_queryset(queryset)))
+
+    async def apaginate_keyset(self, queryset):
+        return self.split_keyset_page([row async for row in self.keyset_page_queryset(queryset)])
+
+    def get_keyset_context(self, next_cursor):
+        context = {'next_cursor': next_cursor}
+        if next_cursor is not None:
+            params = self.request.GET.copy()
+            params[self.cursor_param] = next_cursor
+            context['next_page_query'] = params.urlencode()
+        return context
+
+    def get_context_data(self, **kwargs):
+        rows, next_cursor = self.paginate_keyset(self.object_list)
+        context = super().get_context_data(object_list=rows, **kwargs)
+        context.update(self.get_keyset_context(next_cursor))
+        return context
@@ -0,0 +1,93 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .bulk import add_by_pk
+from .catalog_cache import bump_catalog_version
+from .jobs import enqueue
+from .models import Product, Purchase, Refund
+from .retry import with_retry
+from .wallet import credit
+
+CHUNK_SIZE = 500
+
+
+def request_refund(user_id, purchase_id):
+    """Open a pending refund for the user's own purchase if its window is still open.
+
+    One INSERT ... SELECT checks ownership, the window and uniqueness, so doomed requests cost a single
+    query. Returns the refund, or None when the purchase is not refundable.
+    """
+    now = timezone.now()
+    adapted_now = connection.ops.adapt_datetimefield_value(now)
+    refunds, purchases = Refund._meta.db_table, Purchase._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {refunds} (refund_purchase_id, refund_time) '
+            f'SELECT id, %s FROM {purchases} WHERE id = %s AND user_id = %s AND refundable_until > %s '
+            f'ON CONFLICT (refund_purchase_id) DO NOTHING RETURNING id',
+            [adapted_now, purchase_id, user_id, adapted_now],
+        )
+        row = cursor.fetchone()
+    return Refund(pk=row[0], refund_purchase_id=purchase_id, refund_time=now) if row else None
+
+
+def _chunks(ids, size):
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def _approve_chunk(refund_ids):
+    with transaction.atomic():
+        rows = list(Refund.objects.select_for_update().filter(pk__in=refund_ids).values_list(
+            'pk', 'refund_purchase_id', 'refund_purchase__user_id', 'refund_purchase__product_id',
+            'refund_purchase__quantity', 'refund_purchase__unit_price', 'refund_purchase__product__price',
+            'refund_purchase__purchase_time',
+        ))
+        if not rows:
+            return 0
+
+        stock = defaultdict(int)
+        credits = defaultdict(int)
+        lines = []
+        for _, _, user_id, product_id, quantity, unit_price, price, purchase_time in rows:
+            # Purchases made before unit_price was recorded fall back to the current price.
+            amount = (price if unit_price is None else unit_price) * quantity
+            stock[product_id] += quantity
+            credits[user_id] += amount
+            lines.append((product_id, quantity, amount, purchase_time))
+
+        add_by_pk(Product, 'stock', stock)
+        credit(credits)
+        enqueue('update_refund_stats', lines=lines, when=timezone.now())
+        Refund.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        Purchase.objects.filter(pk__in=[row[1] for row in rows]).delete()
+        bump_catalog_version()
+        return len(rows)
+
+
+def _reject_chunk(refund_ids):
+    with transaction.atomic():
+        return Refund.objects.filter(pk__in=refund_ids).delete()[0]
+
+
+def approve_refunds(refund_ids, chunk_size=CHUNK_SIZE):
+    return sum(with_retry(_approve_chunk, chunk) for chunk in _chunks(refund_ids, chunk_size))
+
+
+def reject_refunds(refund_ids, chunk_size=CHUNK_SIZE):
+    return sum(with_retry(_reject_chunk, chunk) for chunk in _chunks(refund_ids, chunk_size))
+
+
+def expire_refunds(chunk_size=CHUNK_SIZE, now=None):
+    """Reject pending refunds left unreviewed for REFUND_REVIEW_DAYS after the purchase's refund window."""
+    cutoff = (now or timezone.now()) - timedelta(days=settings.REFUND_REVIEW_DAYS)
+    expired = Refund.objects.filter(refund_purchase__refundable_until__lt=cutoff).order_by('pk')
+    rejected = 0
+    while chunk := list(expired.values_list('pk', flat=True)[:chunk_size]):
+        rejected += reject_refunds(chunk, chunk_size)
+    return rejected
@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .catalog_cache import bump_catalog_version
+from .checkout import CheckoutError, _charge, _take_stock, check_quantity
+from .models import Reservation
+from .retry import with_retry
+from .stock import return_stock
+
+
+class ReservationExpired(CheckoutError):
+    pass
+
+
+def _reserve(user_id, product_id, quantity, ttl):
+    with transaction.atomic():
+        shard_id = _take_stock(product_id, quantity)
+        bump_catalog_version()
+        return Reservation.objects.create(
+            user_id=user_id, product_id=product_id, shard_id=shard_id, quantity=quantity,
+            expires_at=timezone.now() + timedelta(seconds=ttl),
+        )
+
+
+def reserve(user, product_id, quantity, ttl=None):
+    """Hold ``quantity`` units for ``ttl`` seconds; confirm the hold to buy them or let it expire."""
+    check_quantity(quantity)
+    return with_retry(_reserve, user.pk, product_id, quantity, ttl or settings.RESERVATION_TTL)
+
+
+def _confirm(user_id, reservation_id):
+    with transaction.atomic():
+        now = timezone.now()
+        # Claim the hold with a write first, like checkout, so the sweeper and a second confirm see it as gone.
+        hold = Reservation.objects.filter(pk=reservation_id, user_id=user_id)
+        if not hold.filter(expires_at__gt=now).update(expires_at=now):
+            raise ReservationExpired('The reservation has expired.')
+        product_id, quantity = hold.values_list('product_id', 'quantity').get()
+        hold.delete()
+        return _charge(user_id, product_id, quantity)
+
+
+def confirm(user, reservation_id):
+    """Turn a live hold into a purchase; a failed payment keeps the hold until it expires."""
+    return with_retry(_confirm, user.pk, reservation_id)
+
+
+def _release(reservations):
+    return_stock((hold.product_id, hold.shard_id, hold.quantity) for hold in reservations)
+    Reservation.objects.filter(pk__in=[hold.pk for hold in reservations]).delete()
+    bump_catalog_version()
+    return len(reservations)
+
+
+def release(user, reservation_id):
+    with transaction.atomic():
+        holds = list(Reservation.objects.select_for_update().filter(pk=reservation_id, user=user))
+        return _release(holds) if holds else 0
+
+
+def release_expired(now=None, batch_size=500):
+    """Return the stock of up to ``batch_size`` expired holds; call repeatedly until it returns 0."""
+    with transaction.atomic():
+        expired = list(Reservation.objects.select_for_update().filter(
+            expires_at__lte=now or timezone.now(),
+        ).only('product_id', 'shard_id', 'quantity').order_by('expires_at')[:batch_size])
+        return _release(expired) if expired else 0
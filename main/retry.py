@@ -0,0 +1,52 @@
+import random
+import threading
+import time
+from collections import deque
+
+from django.db import OperationalError
+
+
+class ConflictMeter:
+    def __init__(self, window=60):
+        self.window = window
+        self.events = deque()
+        self.lock = threading.Lock()
+
+    def record(self):
+        now = time.monotonic()
+        with self.lock:
+            self.events.append(now)
+            self._trim(now)
+
+    def per_second(self):
+        now = time.monotonic()
+        with self.lock:
+            self._trim(now)
+            return len(self.events) / self.window
+
+    def _trim(self, now):
+        while self.events and self.events[0] < now - self.window:
+            self.events.popleft()
+
+
+conflicts = ConflictMeter()
+
+MAX_RETRIES = 15
+BACKOFF_BASE = 0.005
+BACKOFF_MAX = 0.2
+
+
+def is_lock_error(error):
+    return 'locked' in str(error)
+
+
+def with_retry(func, *args, **kwargs):
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return func(*args, **kwargs)
+        except OperationalError as error:
+            if not is_lock_error(error) or attempt == MAX_RETRIES:
+                raise
+            conflicts.record()
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+            time.sleep(random.uniform(0, delay))
@@ -0,0 +1,78 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA = 'replica'
+ROUTED_APPS = {'main'}
+
+
+class RoutingState:
+    """Per-request routing flags; mutated in place so threads running the request's sync code see changes."""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.replica = False
+        self.wrote = False
+
+    def use_replica(self):
+        return self.replica and not self.pinned and not self.wrote
+
+
+_state = ContextVar('db_routing', default=None)
+
+
+def start_request(pinned=False):
+    state = RoutingState(pinned)
+    _state.set(state)
+    return state
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def reads_from_replica():
+    state = _state.get()
+    return bool(state and state.use_replica() and replica_configured())
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside the block, e.g. to fill a shared cache right after a write."""
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    replica, state.replica = state.replica, False
+    try:
+        yield
+    finally:
+        state.replica = replica
+
+
+class ReplicaRouter:
+    """Send reads of replica-safe views to the replica; everything else, and any read after a write, to default."""
+
+    # Both methods name default explicitly: returning None would let Django follow the instance's own database,
+    # so objects loaded from the replica would be saved to it and read their relations from it.
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in ROUTED_APPS and reads_from_replica():
+            return REPLICA
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= {'default', REPLICA}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from replication (or sync_replica), never from migrate.
+        return False if db == REPLICA else None
@@ -0,0 +1,78 @@
+from django.db import connection
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'main_product_fts'
+PG_SEARCH_VECTOR = "to_tsvector('english', name || ' ' || description)"
+
+
+def _fts_query(text, prefix=False):
+    tokens = [token.replace('"', '""') for token in text.split()]
+    star = '*' if prefix else ''
+    return ' '.join(f'"{token}"{star}' for token in tokens if token)
+
+
+def index_product(product):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)',
+            [product.pk, product.name, product.description],
+        )
+
+
+def index_products(product_ids):
+    if connection.vendor != 'sqlite' or not product_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', product_ids)
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, description) '
+            f'SELECT id, name, description FROM main_product WHERE id IN ({placeholders})',
+            product_ids,
+        )
+
+
+def unindex_product(product_id):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product_id])
+
+
+def rebuild_index():
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, description) SELECT id, name, description FROM main_product'
+        )
+
+
+def search_products(queryset, text, prefix=False):
+    """Full-text match on name and description; ``prefix`` also matches words that start with each token."""
+    text = text.strip()
+    if not text:
+        return queryset
+
+    if connection.vendor == 'sqlite':
+        query = _fts_query(text, prefix)
+        if not query:
+            return queryset
+        matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [query])
+        return queryset.filter(pk__in=matches)
+
+    if prefix:
+        # Type-ahead searches (admin, autocomplete) on the remaining backends match the start of the name.
+        return queryset.filter(name__istartswith=text)
+
+    if connection.vendor == 'postgresql':
+        match = RawSQL(f"{PG_SEARCH_VECTOR} @@ plainto_tsquery('english', %s)", [text],
+                       output_field=BooleanField())
+        return queryset.alias(search_match=match).filter(search_match=True)
+
+    return queryset.filter(Q(name__icontains=text) | Q(description__icontains=text))
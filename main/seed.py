@@ -0,0 +1,75 @@
+import random
+from collections import defaultdict
+
+from django.contrib.auth.hashers import make_password
+
+from .catalog_cache import bump_catalog_version
+from .models import Product, Purchase, Refund, User
+from .search import index_products
+from .stats import record_sales
+
+PASSWORD = 'seed-Passw0rd!'
+
+
+def seed_shop(users, products, purchases, refunds, prefix='seed', seed=0, batch_size=1000):
+    """Bulk insert a reproducible shop: the same arguments always produce the same rows.
+
+    Seeded purchases are counted in the sales stats but not charged to the wallets.
+    """
+    rng = random.Random(seed)
+    password = make_password(PASSWORD)
+
+    User.objects.bulk_create(
+        (User(username=f'{prefix}-user-{i}', password=password, wallet=10 ** 6) for i in range(users)),
+        batch_size=batch_size,
+    )
+    Product.objects.bulk_create(
+        (
+            Product(sku=f'{prefix}-{i}', name=f'{prefix.title()} product {i}', description=f'Seeded product {i}',
+                    price=rng.randint(1, 200), stock=rng.randint(10 ** 4, 10 ** 5))
+            for i in range(products)
+        ),
+        batch_size=batch_size,
+    )
+    user_ids = list(seeded_users(prefix).order_by('pk').values_list('pk', flat=True))
+    prices = dict(seeded_products(prefix).order_by('pk').values_list('pk', 'price'))
+    product_ids = list(prices)
+
+    lines = []
+    purchase_rows = []
+    refundable_until = Purchase.refund_deadline()
+    for _ in range(purchases):
+        product_id, quantity = rng.choice(product_ids), rng.randint(1, 3)
+        purchase_rows.append(Purchase(user_id=rng.choice(user_ids), product_id=product_id, quantity=quantity,
+                                      unit_price=prices[product_id], refundable_until=refundable_until))
+        lines.append((product_id, quantity, prices[product_id] * quantity))
+    Purchase.objects.bulk_create(purchase_rows, batch_size=batch_size)
+
+    totals = defaultdict(lambda: [0, 0])
+    for product_id, quantity, amount in lines:
+        totals[product_id][0] += quantity
+        totals[product_id][1] += amount
+    record_sales([(product_id, quantity, amount) for product_id, (quantity, amount) in totals.items()])
+
+    purchase_ids = list(Purchase.objects.filter(user_id__in=user_ids).values_list('pk', flat=True))
+    refund_ids = rng.sample(purchase_ids, min(refunds, len(purchase_ids)))
+    Refund.objects.bulk_create((Refund(refund_purchase_id=pk) for pk in refund_ids), batch_size=batch_size)
+
+    index_products(product_ids)
+    bump_catalog_version()
+    return {'users': len(user_ids), 'products': len(product_ids), 'purchases': len(purchase_ids),
+            'refunds': len(refund_ids)}
+
+
+def seeded_users(prefix='seed'):
+    return User.objects.filter(username__startswith=f'{prefix}-user-')
+
+
+def seeded_products(prefix='seed'):
+    return Product.objects.filter(sku__startswith=f'{prefix}-')
+
+
+def clear_seed(prefix='seed'):
+    seeded_users(prefix).delete()
+    seeded_products(prefix).delete()
+    bump_catalog_version()
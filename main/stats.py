@@ -0,0 +1,53 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .bulk import add_fields_by_pk, batched
+from .forecast import demand_weights
+from .models import DailySales, ProductSales
+
+
+# Keeps each UPDATE ... CASE short; its cost grows with the square of the rows it covers.
+UPDATE_BATCH_SIZE = 500
+
+
+def _add(model, rows):
+    model.objects.bulk_create([model(pk=pk) for pk in rows], ignore_conflicts=True, batch_size=UPDATE_BATCH_SIZE)
+    for pks in batched(rows, UPDATE_BATCH_SIZE):
+        add_fields_by_pk(model, {pk: rows[pk] for pk in pks})
+
+
+def _accumulate(rows, key, **deltas):
+    for field, delta in deltas.items():
+        rows[key][field] = rows[key].get(field, 0) + delta
+
+
+def record_sales(lines, when=None):
+    """Count ``(product_id, quantity, amount)`` sale lines; update_sales_stats applies them after checkout."""
+    when = when or timezone.now()
+    day = timezone.localdate(when)
+    products, days = defaultdict(dict), defaultdict(dict)
+    with transaction.atomic():
+        weight, = demand_weights(when)
+        for product_id, quantity, amount in lines:
+            _accumulate(products, product_id, units_sold=quantity, revenue=amount, demand_score=quantity * weight)
+            _accumulate(days, day, units_sold=quantity, revenue=amount)
+        _add(ProductSales, products)
+        _add(DailySales, days)
+
+
+def record_refunds(lines, when=None):
+    """Move ``(product_id, quantity, amount, purchase_time)`` lines from sales to refunds."""
+    day = timezone.localdate(when)
+    products, days = defaultdict(dict), defaultdict(dict)
+    with transaction.atomic():
+        # Refunds withdraw the sale's demand at the weight it was added with.
+        weights = demand_weights(*(line[3] for line in lines))
+        for (product_id, quantity, amount, purchase_time), weight in zip(lines, weights):
+            _accumulate(products, product_id, units_sold=-quantity, revenue=-amount,
+                        refunded_units=quantity, refunded_amount=amount, demand_score=-quantity * weight)
+            _accumulate(days, timezone.localdate(purchase_time), units_sold=-quantity, revenue=-amount)
+            _accumulate(days, day, refunded_units=quantity, refunded_amount=amount)
+        _add(ProductSales, products)
+        _add(DailySales, days)
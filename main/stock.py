@@ -0,0 +1,86 @@
+import random
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .bulk import add_by_pk
+from .models import Product, StockShard
+
+
+class OutOfStock(Exception):
+    pass
+
+
+def take_stock(product_id, quantity):
+    """Decrement ``quantity`` from the product row, from one of its shards or, failing both, across them.
+
+    Returns the id of the shard when a single shard covered the take, otherwise None; units of a take that
+    spanned counters go back to the product row. Call inside the transaction that uses the units, which also
+    undoes a partial take that ran out.
+    """
+    # Write first so SQLite takes the write lock up front instead of upgrading a read lock mid-transaction.
+    if Product.objects.filter(pk=product_id, stock__gte=quantity).update(stock=F('stock') - quantity):
+        return None
+
+    shards = list(StockShard.objects.filter(product_id=product_id, stock__gt=0).values_list('pk', 'stock'))
+    random.shuffle(shards)
+    for shard_id, stock in shards:
+        if stock >= quantity and StockShard.objects.filter(pk=shard_id, stock__gte=quantity).update(
+            stock=F('stock') - quantity,
+        ):
+            return shard_id
+
+    remaining = quantity
+    row_stock = Product.objects.filter(pk=product_id).values_list('stock', flat=True).get()
+    for model, pk, stock in [(Product, product_id, row_stock)] + [(StockShard, *shard) for shard in shards]:
+        part = min(remaining, stock)
+        if part and model.objects.filter(pk=pk, stock__gte=part).update(stock=F('stock') - part):
+            remaining -= part
+            if not remaining:
+                return None
+    raise OutOfStock('Not enough items in stock.')
+
+
+def return_stock(lines):
+    """Put back ``(product_id, shard_id, quantity)`` lines taken by :func:`take_stock`."""
+    products, shards = defaultdict(int), defaultdict(int)
+    for product_id, shard_id, quantity in lines:
+        if shard_id is None:
+            products[product_id] += quantity
+        else:
+            shards[shard_id] += quantity
+    add_by_pk(Product, 'stock', products)
+    add_by_pk(StockShard, 'stock', shards)
+
+
+def split_stock(product_id, shards):
+    """Move the product's whole stock into ``shards`` counters, merging any existing shards first."""
+    with transaction.atomic():
+        merge_stock(product_id)
+        product = Product.objects.select_for_update().only('stock').get(pk=product_id)
+        size, extra = divmod(product.stock, shards)
+        StockShard.objects.bulk_create(
+            StockShard(product_id=product_id, index=index, stock=size + (index < extra)) for index in range(shards)
+        )
+        Product.objects.filter(pk=product_id).update(stock=0)
+
+
+def merge_stock(product_id):
+    """Fold the product's shards back into ``Product.stock``."""
+    with transaction.atomic():
+        Product.objects.select_for_update().filter(pk=product_id).values_list('pk', flat=True).get()
+        sharded = StockShard.objects.filter(product_id=product_id).aggregate(total=Sum('stock'))['total'] or 0
+        StockShard.objects.filter(product_id=product_id).delete()
+        Product.objects.filter(pk=product_id).update(stock=F('stock') + sharded)
+
+
+def with_available_stock(queryset):
+    """Annotate ``available_stock``: the product row plus its shards."""
+    sharded = StockShard.objects.filter(product=OuterRef('pk')).order_by().values('product').annotate(
+        total=Sum('stock'),
+    ).values('total')
+    return queryset.annotate(
+        available_stock=F('stock') + Coalesce(Subquery(sharded), Value(0), output_field=IntegerField()),
+    )
@@ -0,0 +1,31 @@
+from decimal import Decimal
+
+from django.utils.dateparse import parse_datetime
+
+from .jobs import task
+from .models import Product
+from .stats import record_refunds, record_sales
+
+
+def _existing_products(lines):
+    return set(Product.objects.filter(pk__in={line[0] for line in lines}).values_list('pk', flat=True))
+
+
+@task
+def update_sales_stats(lines, when):
+    # Lines of products deleted since the sale are dropped; their counters were deleted with them.
+    existing = _existing_products(lines)
+    record_sales(
+        [(product_id, quantity, Decimal(amount)) for product_id, quantity, amount in lines if product_id in existing],
+        when=parse_datetime(when),
+    )
+
+
+@task
+def update_refund_stats(lines, when):
+    existing = _existing_products(lines)
+    record_refunds(
+        [(product_id, quantity, Decimal(amount), parse_datetime(purchase_time))
+         for product_id, quantity, amount, purchase_time in lines if product_id in existing],
+        when=parse_datetime(when),
+    )
@@ -1,3 +1,1204 @@
-from django.test import TestCase
+import gzip
+import json
+import math
+import os
+import tempfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from functools import partial
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.db.models import QuerySet, Sum
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .auth import check_shared_user_cache
+from .catalog_cache import catalog_cache
+from .imports import import_products, read_rows
+from .jobs import MAX_ATTEMPTS, claim, drain, enqueue, queue_stats, run, task
+from .metrics import request_metrics
+from .seed import clear_seed, seed_shop, seeded_products
+from .stock import merge_stock, split_stock
+from .forecast import REBASE_PERIODS, demand_epoch, velocity
+from .exports import PURCHASE_COLUMNS, csv_chunks, export_rows
+from .checkout import CheckoutError, InsufficientFunds, OutOfStock, buy_product
+from .pagination import EstimatedCountPaginator
+from .models import (DailySales, Job, Product, ProductSales, Purchase, PurchaseArchive, Refund, Reservation,
+                     StockForecast, StockShard, User, WalletTransaction)
+from .refunds import approve_refunds, request_refund
+from .reservations import ReservationExpired, confirm, release, release_expired, reserve
+from .routers import REPLICA, ReplicaRouter, primary_reads, reads_from_replica, start_request
+from .stats import record_refunds, record_sales
+from .wallet import balance, compact, credit
+from .views import AsyncProductApi, AsyncProductList, AsyncPurchaseList, ProductList, PurchaseList
+
+
+class QueryBudgetMixin:
+    @contextmanager
+    def assertQueryBudget(self, budget):
+        with CaptureQueriesContext(connection) as queries:
+            yield queries
+        self.assertLessEqual(
+            len(queries), budget,
+            f'{len(queries)} queries exceeded the budget of {budget}:\n'
+            + '\n'.join(query['sql'] for query in queries.captured_queries),
+        )
+
+    def assertQueriesFlat(self, url, add_rows, budget):
+        # Warm the session and user caches so both measurements see the steady state.
+        self.client.get(url)
+        add_rows()
+        with self.assertQueryBudget(budget) as before:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        add_rows()
+        with self.assertQueryBudget(budget) as after:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(len(before), len(after), f'Query count for {url} grows with row count.')
+
+
+class ProductListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = [
+            Product.objects.create(name=f'Product {i}', description='Plain item', stock=5)
+            for i in range(ProductList.page_size + 5)
+        ]
+
+    def test_keyset_pages_cover_catalog_once(self):
+        response = self.client.get(reverse('product_list'))
+        first_page = list(response.context['products'])
+        self.assertEqual(len(first_page), ProductList.page_size)
+
+        response = self.client.get(reverse('product_list'), {'after': response.context['next_cursor']})
+        second_page = list(response.context['products'])
+        self.assertEqual(len(second_page), 5)
+        self.assertIsNone(response.context['next_cursor'])
+        self.assertEqual(first_page + second_page, self.products)
+
+    def test_out_of_range_cursor_serves_first_page(self):
+        first_api_page = self.client.get(reverse('product_api')).json()
+        for cursor in ('99999999999999999999999', '-99999999999999999999999', 'x'):
+            response = self.client.get(reverse('product_list'), {'after': cursor})
+            self.assertEqual(list(response.context['products']), self.products[:ProductList.page_size])
+            response = self.client.get(reverse('product_api'), {'after': cursor})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), first_api_page)
+
+    def test_page_query_count_is_constant(self):
+        Product.objects.bulk_create(Product(name='Extra', description='Extra', stock=1) for _ in range(100))
+        with self.assertNumQueries(1):
+            self.client.get(reverse('product_list'))
+
+    def test_catalog_cache_serves_repeat_pages(self):
+        self.client.get(reverse('product_list'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('product_list'))
+        self.assertEqual(list(response.context['products']), self.products[:ProductList.page_size])
+
+        self.products[0].stock = 1
+        self.products[0].save()
+        response = self.client.get(reverse('product_list'))
+        self.assertEqual(response.context['products'][0].stock, 1)
+
+    def test_product_fragments_are_versioned_by_updated_at(self):
+        product = self.products[0]
+        self.client.get(reverse('product_list'))
+        Product.objects.filter(pk=product.pk).update(name='Renamed quietly', stock=2)
+        catalog_cache.bump()
+        response = self.client.get(reverse('product_list'))
+        self.assertContains(response, '<h2>Product 0</h2>', html=True)
+        self.assertContains(response, 'Stock: 2')
+
+        product.refresh_from_db()
+        product.name = 'Renamed'
+        product.save()
+        self.assertContains(self.client.get(reverse('product_list')), '<h2>Renamed</h2>', html=True)
+
+    def test_search_index_follows_saves_and_deletes(self):
+        lamp = Product.objects.create(name='Desk lamp', description='Warm light', stock=3)
+        response = self.client.get(reverse('product_list'), {'q': 'lamp'})
+        self.assertEqual(list(response.context['products']), [lamp])
+
+        lamp.name = 'Desk light'
+        lamp.save()
+        response = self.client.get(reverse('product_list'), {'q': 'lamp'})
+        self.assertEqual(list(response.context['products']), [])
+
+        lamp.delete()
+        response = self.client.get(reverse('product_list'), {'q': 'warm'})
+        self.assertEqual(list(response.context['products']), [])
+
+
+class ListQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='staff', password='secret', is_staff=True)
+        self.client.force_login(self.user)
+
+    def add_purchases(self, count=10):
+        products = Product.objects.bulk_create(
+            Product(name=f'Product {i}', description='Item', stock=5) for i in range(count)
+        )
+        catalog_cache.bump()
+        return Purchase.objects.bulk_create(
+            Purchase(user=self.user, product=product, quantity=1) for product in products
+        )
+
+    def test_purchase_list_is_flat(self):
+        self.add_purchases(2)
+        self.assertQueriesFlat(reverse('purchase_list'), self.add_purchases, budget=3)
+
+    def test_refund_list_is_flat(self):
+        def add_refunds():
+            Refund.objects.bulk_create(Refund(refund_purchase=purchase) for purchase in self.add_purchases())
+
+        add_refunds()
+        self.assertQueriesFlat(reverse('refunds'), add_refunds, budget=3)
+
+    def test_product_list_is_flat(self):
+        self.assertQueriesFlat(reverse('product_list'), self.add_purchases, budget=3)
+
+    def test_purchase_list_pages_newest_first(self):
+        purchases = self.add_purchases(PurchaseList.page_size + 3)
+        response = self.client.get(reverse('purchase_list'))
+        self.assertEqual(response.context['purchases'][0], purchases[-1])
+        response = self.client.get(reverse('purchase_list') + '?' + response.context['next_page_query'])
+        self.assertEqual(list(response.context['purchases']), purchases[2::-1])
+
+
+class PurchaseHistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='secret')
+        self.product = Product.objects.create(name='Lamp', description='Light', stock=5)
+        self.client.force_login(self.user)
+
+    def add_purchase(self, days_ago):
+        purchase = Purchase.objects.create(user=self.user, product=self.product, quantity=1)
+        Purchase.objects.filter(pk=purchase.pk).update(purchase_time=timezone.now() - timedelta(days=days_ago))
+        return purchase
+
+    def test_history_query_uses_user_time_index(self):
+        self.add_purchase(1)
+        date_from = (timezone.now() - timedelta(days=30)).date().isoformat()
+        for params in ({'from': date_from}, {'from': date_from, 'after': f'{timezone.now().isoformat()}_1'}):
+            request = RequestFactory().get(reverse('purchase_list'), params)
+            request.user = self.user
+            view = PurchaseList()
+            view.setup(request)
+            queryset = view.keyset_page_queryset(view.get_queryset())
+            self.assertIn('purchase_user_time_idx', queryset.explain())
+
+    def test_date_range_filter_accepts_last_date(self):
+        purchase = self.add_purchase(1)
+        response = self.client.get(reverse('purchase_list'), {'to': '9999-12-31'})
+        self.assertEqual(list(response.context['purchases']), [purchase])
+
+    def test_date_range_filter(self):
+        recent = self.add_purchase(1)
+        self.add_purchase(40)
+        date_from = (timezone.now() - timedelta(days=7)).date().isoformat()
+        response = self.client.get(reverse('purchase_list'), {'from': date_from})
+        self.assertEqual(list(response.context['purchases']), [recent])
+
+    def test_archive_moves_old_purchases(self):
+        recent = self.add_purchase(1)
+        old = [self.add_purchase(400) for _ in range(3)]
+        pending = self.add_purchase(500)
+        Refund.objects.create(refund_purchase=pending)
+
+        call_command('archive_purchases', days=365, batch_size=2, stdout=StringIO())
+
+        self.assertEqual(set(Purchase.objects.values_list('pk', flat=True)), {recent.pk, pending.pk})
+        self.assertEqual(set(PurchaseArchive.objects.values_list('pk', flat=True)), {p.pk for p in old})
+
+
+class RefundEligibilityTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='secret')
+        self.product = Product.objects.create(name='Lamp', description='Light', stock=5)
+        self.fresh = Purchase.objects.create(user=self.user, product=self.product, quantity=1)
+        self.expired = Purchase.objects.create(user=self.user, product=self.product, quantity=1)
+        Purchase.objects.filter(pk=self.expired.pk).update(refundable_until=timezone.now() - timedelta(seconds=1))
+        self.client.force_login(self.user)
+
+    def test_refund_is_one_conditional_insert(self):
+        with self.assertNumQueries(1):
+            refund = request_refund(self.user.pk, self.fresh.pk)
+        self.assertEqual(Refund.objects.get().pk, refund.pk)
+
+        with self.assertNumQueries(1):
+            self.assertIsNone(request_refund(self.user.pk, self.fresh.pk))
+        self.assertIsNone(request_refund(self.user.pk, self.expired.pk))
+        other = User.objects.create_user(username='other', password='secret')
+        self.assertIsNone(request_refund(other.pk, self.fresh.pk))
+        self.assertEqual(Refund.objects.count(), 1)
+
+    def test_create_refund_view(self):
+        response = self.client.post(reverse('create_refund', args=[self.fresh.pk]))
+        self.assertTemplateUsed(response, 'main/refund/confirm_refund.html')
+        response = self.client.post(reverse('create_refund', args=[self.expired.pk]), follow=True)
+        self.assertContains(response, 'cannot be refunded')
+        self.assertEqual(Refund.objects.count(), 1)
+
+    def test_listing_shows_return_button_only_when_eligible(self):
+        Refund.objects.create(refund_purchase=Purchase.objects.create(user=self.user, product=self.product, quantity=1))
+        response = self.client.get(reverse('purchase_list'))
+        eligible = {purchase.pk: purchase.can_refund for purchase in response.context['purchases']}
+        self.assertEqual(list(eligible.values()).count(True), 1)
+        self.assertTrue(eligible[self.fresh.pk])
+        self.assertContains(response, 'Return Product', count=1)
+
+    def test_expire_refunds_rejects_stale_pending_refunds(self):
+        stale = Refund.objects.create(refund_purchase=self.expired)
+        Purchase.objects.filter(pk=self.expired.pk).update(
+            refundable_until=timezone.now() - timedelta(days=settings.REFUND_REVIEW_DAYS + 1),
+        )
+        recent = Refund.objects.create(refund_purchase=self.fresh)
+        out = StringIO()
+        call_command('expire_refunds', chunk_size=1, stdout=out)
+        self.assertIn('Expired 1 refunds', out.getvalue())
+        self.assertEqual(list(Refund.objects.all()), [recent])
+        self.assertTrue(Purchase.objects.filter(pk=stale.refund_purchase_id).exists())
+
+
+class RefundProcessingTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='secret', is_staff=True)
+        self.buyers = [User.objects.create_user(username=f'buyer{i}', password='secret', wallet=0) for i in range(3)]
+        self.product = Product.objects.create(name='Lamp', description='Light', price=10, stock=0)
+        self.refunds = [
+            Refund.objects.create(refund_purchase=Purchase.objects.create(user=buyer, product=self.product, quantity=2))
+            for buyer in self.buyers
+        ]
+        self.client.force_login(self.staff)
+
+    def test_batch_approve_restores_stock_and_credits_wallets(self):
+        refund_ids = [refund.pk for refund in self.refunds[:2]]
+        self.client.post(reverse('batch_refunds'), {'refund_ids': refund_ids, 'action': 'agree'})
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 4)
+        self.assertEqual([buyer.balance for buyer in User.objects.filter(username__startswith='buyer')
+                          .order_by('username')], [20, 20, 0])
+        self.assertEqual(list(Refund.objects.all()), [self.refunds[2]])
+        self.assertEqual(Purchase.objects.count(), 1)
+
+    def test_batch_approve_uses_constant_queries_per_chunk(self):
+        with self.assertNumQueries(11), self.captureOnCommitCallbacks(execute=True):
+            approve_refunds([refund.pk for refund in self.refunds])
+
+    def test_process_refunds_command_rejects_pending(self):
+        call_command('process_refunds', 'reject', chunk_size=2, stdout=StringIO())
+        self.assertFalse(Refund.objects.exists())
+        self.assertEqual(Purchase.objects.count(), 3)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+
+
+class SalesStatsTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='secret', is_staff=True, wallet=1000)
+        self.lamp = Product.objects.create(name='Lamp', description='Light', price=10, stock=10)
+        self.desk = Product.objects.create(name='Desk', description='Oak', price=100, stock=10)
+
+    def buy(self, product, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            purchase = buy_product(self.staff, product.pk, quantity)
+        drain()
+        return purchase
+
+    def test_counters_follow_purchases_and_refunds(self):
+        self.buy(self.lamp, 3)
+        purchase = self.buy(self.desk, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            approve_refunds([Refund.objects.create(refund_purchase=purchase).pk])
+        self.assertEqual(ProductSales.objects.get(pk=self.desk.pk).refunded_units, 0)
+        drain()
+
+        lamp_sales, desk_sales = ProductSales.objects.get(pk=self.lamp.pk), ProductSales.objects.get(pk=self.desk.pk)
+        self.assertEqual((lamp_sales.units_sold, lamp_sales.revenue), (3, 30))
+        self.assertEqual((desk_sales.units_sold, desk_sales.refunded_units, desk_sales.refunded_amount), (0, 1, 100))
+        today = DailySales.objects.get(day=timezone.localdate())
+        self.assertEqual((today.units_sold, today.revenue, today.refunded_amount), (3, 30, 100))
+
+    def test_report_reads_counters_only(self):
+        self.buy(self.lamp, 2)
+        self.client.force_login(self.staff)
+        # user and balance (the session comes from the cache), top sellers, days
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('sales_report'))
+        self.assertEqual(response.context['top_sellers'][0].product, self.lamp)
+
+    def test_rebuild_fixes_drift(self):
+        self.buy(self.lamp, 2)
+        ProductSales.objects.filter(pk=self.lamp.pk).update(units_sold=99)
+        out = StringIO()
+        call_command('rebuild_sales_stats', stdout=out)
+        self.assertIn('Drift: 1 product counters, 0 daily counters.', out.getvalue())
+        self.assertEqual(ProductSales.objects.get(pk=self.lamp.pk).units_sold, 2)
+
+    def test_rebuild_waits_for_queued_stats(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            buy_product(self.staff, self.lamp.pk, 2)
+        with self.assertRaisesMessage(CommandError, '1 sales stats jobs are still queued'):
+            call_command('rebuild_sales_stats', stdout=StringIO())
+
+        out = StringIO()
+        call_command('rebuild_sales_stats', drain=True, stdout=out)
+        self.assertIn('Drift: 0 product counters, 0 daily counters.', out.getvalue())
+        self.assertEqual(ProductSales.objects.get(pk=self.lamp.pk).units_sold, 2)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='secret', is_staff=True)
+        self.product = Product.objects.create(name='Lamp', description='Light', stock=0)
+        self.client.force_login(self.staff)
+
+    def add_purchases(self, count):
+        Purchase.objects.bulk_create(
+            Purchase(user=self.staff, product=self.product, quantity=1, unit_price=10) for _ in range(count)
+        )
+
+    def test_csv_export_streams_rows(self):
+        self.add_purchases(3)
+        response = self.client.get(reverse('export', args=['purchases']))
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], ','.join(PURCHASE_COLUMNS))
+        self.assertEqual(len(lines), 4)
+
+    def test_gzip_ndjson_export(self):
+        Refund.objects.create(refund_purchase=Purchase.objects.create(user=self.staff, product=self.product,
+                                                                      quantity=2))
+        response = self.client.get(reverse('export', args=['refunds']), {'format': 'ndjson', 'gzip': '1'})
+        rows = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual(json.loads(rows[0])['refund_purchase__quantity'], 2)
+
+    def test_gzip_needs_explicit_flag(self):
+        response = self.client.get(reverse('export', args=['purchases']), {'gzip': '0'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="purchases.csv"')
+
+    def test_export_is_staff_only(self):
+        self.client.force_login(User.objects.create_user(username='buyer', password='secret'))
+        response = self.client.get(reverse('export', args=['purchases']))
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+
+    def peak_export_memory(self):
+        tracemalloc.start()
+        rows = export_rows(Purchase.objects.all(), PURCHASE_COLUMNS, chunk_size=100)
+        for _ in csv_chunks(PURCHASE_COLUMNS, rows, chunk_size=100):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+
+    def test_export_memory_stays_flat(self):
+        self.add_purchases(1000)
+        small = self.peak_export_memory()
+        # Fifty times the rows; a buffered export would grow with them, a streamed one only by noise.
+        self.add_purchases(49000)
+        self.assertLess(self.peak_export_memory(), small * 1.5)
+
+
+class ProductImportTests(TestCase):
+    feed = (
+        'sku,name,description,price,stock\n'
+        'A-1,Lamp,Warm light,10,5\n'
+        'B-2,Desk,Oak desk,not-a-price,1\n'
+        ',Chair,No sku,5,1\n'
+        'A-1,Lamp v2,Brighter light,12,7\n'
+    )
+
+    def run_import(self, feed, **kwargs):
+        return list(import_products(read_rows(StringIO(feed), 'csv'), **kwargs))
+
+    def test_upserts_valid_rows_and_reports_rejected(self):
+        Product.objects.create(sku='A-1', name='Old lamp', description='Dim', stock=1)
+        reports = self.run_import(self.feed, batch_size=2)
+
+        self.assertEqual([line for report in reports for line, _ in report['rejected']], [3, 4])
+        lamp = Product.objects.get(sku='A-1')
+        self.assertEqual((lamp.name, lamp.price, lamp.stock), ('Lamp v2', 12, 7))
+        self.assertEqual(Product.objects.count(), 1)
+        response = self.client.get(reverse('product_list'), {'q': 'brighter'})
+        self.assertEqual(list(response.context['products']), [lamp])
+
+    def test_dry_run_writes_nothing(self):
+        reports = self.run_import(self.feed, dry_run=True)
+        self.assertEqual(sum(report['imported'] for report in reports), 1)
+        self.assertFalse(Product.objects.exists())
+
+    def test_non_object_rows_are_rejected(self):
+        feed = '[1, 2]\n"x"\n{"sku": "C-3", "name": "Rug", "description": "Wool", "price": "50", "stock": 2}\n'
+        reports = list(import_products(read_rows(StringIO(feed), 'ndjson')))
+        self.assertEqual([line for line, _ in reports[0]['rejected']], [1, 2])
+        self.assertEqual(reports[0]['imported'], 1)
+        reports = list(import_products(read_rows(StringIO('[[1, 2], null]'), 'json')))
+        self.assertEqual([line for line, _ in reports[0]['rejected']], [1, 2])
+
+    def test_staff_upload_ndjson(self):
+        self.client.force_login(User.objects.create_user(username='staff', password='secret', is_staff=True))
+        upload = SimpleUploadedFile('feed.ndjson', b'{"sku": "C-3", "name": "Rug", "description": "Wool", '
+                                                   b'"price": "50", "stock": 2}\n')
+        response = self.client.post(reverse('import_products'), {'file': upload, 'format': 'ndjson'})
+        self.assertEqual(response.context['imported'], 1)
+        self.assertTrue(Product.objects.filter(sku='C-3', stock=2).exists())
+
+
+class ProductApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = [
+            Product.objects.create(name=f'Product {i}', description='Item', price=10, stock=i) for i in range(3)
+        ]
+
+    def test_field_projection(self):
+        response = self.client.get(reverse('product_api'), {'fields': 'name,stock'})
+        self.assertEqual(response.json(), {
+            'results': [{'name': product.name, 'stock': product.stock} for product in self.products],
+            'next': None,
+        })
+        self.assertEqual(self.client.get(reverse('product_api'), {'fields': 'password'}).status_code, 400)
+
+    def test_unchanged_catalog_returns_304_without_queries(self):
+        etag = self.client.get(reverse('product_api'))['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('product_api'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.products[0].stock = 9
+        self.products[0].save()
+        response = self.client.get(reverse('product_api'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Last-Modified', response)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = AsyncRequestFactory()
+        self.user = User.objects.create_user(username='buyer', password='secret')
+        self.product = Product.objects.create(name='Lamp', description='Light', stock=5)
+        self.purchase = Purchase.objects.create(user=self.user, product=self.product, quantity=1)
+
+    def get(self, path, session=None, **params):
+        request = self.factory.get(path, params)
+        request.session = session or SessionStore()
+        return request
+
+    async def test_product_list(self):
+        response = await AsyncProductList.as_view()(self.get('/product_list/', q='lamp'))
+        self.assertContains(response, 'Lamp')
+
+    async def test_purchase_list_requires_login(self):
+        response = await AsyncPurchaseList.as_view()(self.get('/purchase_list/'))
+        self.assertEqual(response.status_code, 302)
+
+        await sync_to_async(self.client.force_login)(self.user)
+        session = await sync_to_async(lambda: self.client.session)()
+        response = await AsyncPurchaseList.as_view()(self.get('/purchase_list/', session))
+        self.assertContains(response, 'Lamp')
+
+    async def test_product_api_conditional_get(self):
+        response = await AsyncProductApi.as_view()(self.get('/api/products/', fields='name'))
+        self.assertEqual(json.loads(response.content)['results'], [{'name': 'Lamp'}])
+
+        request = self.get('/api/products/', fields='name')
+        request.META['HTTP_IF_NONE_MATCH'] = response['ETag']
+        response = await AsyncProductApi.as_view()(request)
+        self.assertEqual(response.status_code, 304)
+
+    def test_middleware_is_async_capable(self):
+        for path in settings.MIDDLEWARE:
+            with self.subTest(middleware=path):
+                self.assertTrue(getattr(import_string(path), 'async_capable', False))
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['main.auth.CachedModelBackend'])
+class SessionUserCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', password='secret', wallet=500)
+        self.product = Product.objects.create(name='Chair', description='Oak', price=100, stock=3)
+        self.client.force_login(self.user)
+
+    def test_logged_in_catalog_hits_no_tables_when_warm(self):
+        self.client.get(reverse('product_list'))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('product_list'))
+
+    def test_user_cache_requires_a_shared_cache(self):
+        self.assertEqual([error.id for error in check_shared_user_cache(None)], ['main.E001'])
+        shared = {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'shop_cache'}
+        with override_settings(CACHES={'default': shared}):
+            self.assertEqual(check_shared_user_cache(None), [])
+
+    def test_wallet_is_fresh_after_purchase(self):
+        self.client.get(reverse('product_list'))
+        self.client.post(reverse('buy_product', args=[self.product.pk]), {'quantity': 2})
+        response = self.client.get(reverse('product_list'))
+        self.assertContains(response, 'Wallet: 300.00 USD')
+
+
+@mock.patch('main.routers.replica_configured', return_value=True)
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', password='secret')
+        self.product = Product.objects.create(name='Lamp', description='Light', price=1, stock=5)
+
+    def test_router_reads_from_replica_until_a_write(self, configured):
+        state = start_request()
+        state.replica = True
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Product), REPLICA)
+        with primary_reads():
+            self.assertEqual(router.db_for_read(Product), 'default')
+        self.assertEqual(router.db_for_read(Product), REPLICA)
+
+        replica_product = Product(name='Lamp', description='Light', stock=1)
+        replica_product._state.db = REPLICA
+        self.assertEqual(router.db_for_write(Product, instance=replica_product), 'default')
+        self.assertEqual(router.db_for_read(Product, instance=replica_product), 'default')
+        self.assertFalse(router.allow_migrate(REPLICA, 'main'))
+        start_request()
+
+    def read_targets(self, *requests):
+        """Yield, per request, whether any of its reads was routed to the replica."""
+        targets = []
+
+        def db_for_read(router, model, **hints):
+            targets.append(reads_from_replica())
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', db_for_read):
+            for request in requests:
+                targets.clear()
+                request()
+                yield any(targets)
+
+    def test_marked_views_read_from_replica_until_the_client_writes(self, configured):
+        self.client.force_login(self.user)
+        list_page = partial(self.client.get, reverse('purchase_list'))
+        targets = self.read_targets(
+            list_page,
+            partial(self.client.get, reverse('login')),
+            partial(self.client.post, reverse('buy_product', args=[self.product.pk]), {'quantity': 1}),
+            list_page,
+        )
+        self.assertEqual(list(targets), [True, False, False, False])
+        self.assertIn('shop_primary_until', self.client.cookies)
+
+        self.client.cookies['shop_primary_until'] = '0'
+        self.assertEqual(list(self.read_targets(list_page)), [True])
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user(username='staff', password='secret', is_staff=True)
+        Product.objects.create(name='Chair', description='Oak', price=100, stock=3)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('product_list'))
+        self.assertRegex(response['Server-Timing'], r'app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+')
+
+    def test_template_time_covers_render_shortcut(self):
+        response = self.client.get(reverse('product_list'))
+        self.assertGreater(float(response['Server-Timing'].split('tpl;dur=')[1]), 0)
+
+    def test_streamed_queries_reach_metrics(self):
+        self.client.force_login(self.staff)
+        before = request_metrics.queries.snapshot().get('export', ([], 0, 0.0))
+        response = self.client.get(reverse('export', args=['purchases']))
+        self.assertEqual(request_metrics.queries.snapshot().get('export', ([], 0, 0.0))[1], before[1])
+        b''.join(response.streaming_content)
+        samples, count, total = request_metrics.queries.snapshot()['export']
+        self.assertEqual(count, before[1] + 1)
+        self.assertGreater(samples[-1], int(response['Server-Timing'].split('desc="')[1].split()[0]))
+
+    def test_metrics_exports_quantiles_per_view(self):
+        self.client.get(reverse('product_list'))
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4')
+        text = response.content.decode()
+        self.assertIn('shop_request_duration_seconds{view="product_list",quantile="0.99"}', text)
+        self.assertIn('shop_request_queries_count{view="product_list"}', text)
+        self.assertIn('shop_catalog_cache_hit_ratio', text)
+
+    def test_metrics_is_staff_only(self):
+        self.client.force_login(User.objects.create_user(username='buyer', password='secret'))
+        self.assertRedirects(self.client.get(reverse('metrics')), reverse('login'), fetch_redirect_response=False)
+
+    async def test_async_requests_count_queries_from_worker_threads(self):
+        response = await self.async_client.get(reverse('product_list'))
+        queries = int(response['Server-Timing'].split('desc="')[1].split()[0])
+        self.assertGreater(queries, 0)
+
+    def test_query_time_is_recorded(self):
+        before = request_metrics.queries.snapshot().get('product_list', ([], 0, 0.0))[2]
+        self.client.get(reverse('product_list') + '?q=chair')
+        after = request_metrics.queries.snapshot()['product_list'][2]
+        self.assertGreater(after, before)
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_slow_queries_are_logged_with_stack(self):
+        with self.assertLogs('main.slow_queries', 'WARNING') as logs:
+            self.client.get(reverse('product_list'))
+        self.assertIn('Slow query', logs.output[0])
+        self.assertIn('File "', logs.output[0])
+
+
+class WalletLedgerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='secret', wallet=100)
+        self.product = Product.objects.create(name='Pen', description='Blue', price=10, stock=100)
+
+    def test_purchases_append_to_ledger_without_touching_snapshot(self):
+        buy_product(self.user, self.product.pk, 3)
+        credit({self.user.pk: 5}, kind=WalletTransaction.TOP_UP)
+        self.assertEqual(User.objects.get(pk=self.user.pk).wallet, 100)
+        self.assertEqual(balance(self.user.pk), 75)
+        self.assertEqual(list(WalletTransaction.objects.values_list('kind', 'amount')),
+                         [('purchase', -30), ('top_up', 5)])
+
+    def test_compaction_folds_and_prunes(self):
+        buy_product(self.user, self.product.pk, 2)
+        buy_product(self.user, self.product.pk, 1)
+        self.assertEqual(compact([self.user.pk], prune_before=timezone.now() + timedelta(seconds=1)), 1)
+
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual((user.wallet, user.balance), (70, 70))
+        self.assertFalse(WalletTransaction.objects.exists())
+        buy_product(self.user, self.product.pk, 1)
+        self.assertEqual(balance(self.user.pk), 60)
+
+    def test_compact_wallets_command(self):
+        buy_product(self.user, self.product.pk, 4)
+        call_command('compact_wallets', stdout=StringIO())
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual((user.wallet, user.balance, WalletTransaction.objects.count()), (60, 60, 1))
+
+
+class SeedAndBenchmarkTests(TestCase):
+    def test_seed_is_reproducible(self):
+        counts = seed_shop(users=3, products=5, purchases=20, refunds=4, seed=7)
+        self.assertEqual(counts, {'users': 3, 'products': 5, 'purchases': 20, 'refunds': 4})
+        first = list(seeded_products().order_by('sku').values_list('sku', 'price', 'stock'))
+        self.assertEqual(ProductSales.objects.aggregate(total=Sum('units_sold'))['total'],
+                         Purchase.objects.aggregate(total=Sum('quantity'))['total'])
+
+        clear_seed()
+        self.assertFalse(Purchase.objects.exists())
+        seed_shop(users=3, products=5, purchases=20, refunds=4, seed=7)
+        self.assertEqual(list(seeded_products().order_by('sku').values_list('sku', 'price', 'stock')), first)
+
+    @override_settings(ALLOWED_HOSTS=['localhost'])
+    def test_bench_shop_writes_json_results(self):
+        cache.clear()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.json')
+            call_command('bench_shop', requests=3, concurrency=1, users=2, products=3, purchases=10, refunds=5,
+                         output=path, stdout=StringIO())
+            with open(path) as file:
+                results = json.load(file)['results']
+        self.assertEqual(set(results), {'home', 'buy_product', 'purchase_list', 'refunds', 'refund_agree'})
+        for name, by_mode in results.items():
+            with self.subTest(case=name):
+                self.assertEqual(by_mode['sequential']['errors'], 0)
+                self.assertEqual(by_mode['sequential']['requests'], 3)
+        self.assertGreater(results['purchase_list']['sequential']['queries_per_request'], 0)
+        self.assertFalse(User.objects.filter(username__startswith='bench-').exists())
+
+
+class StockForecastTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.lamp = Product.objects.create(name='Lamp', description='Light', price=10, stock=10)
+        self.desk = Product.objects.create(name='Desk', description='Oak', price=100, stock=1)
+        self.chair = Product.objects.create(name='Chair', description='Pine', price=50, stock=1)
+
+    def test_velocity_decays_and_refunds_withdraw_demand(self):
+        week_ago = self.now - timedelta(days=settings.VELOCITY_DAYS)
+        record_sales([(self.lamp.pk, 14, 140)], when=self.now)
+        record_sales([(self.desk.pk, 14, 1400)], when=week_ago)
+        lamp, desk = ProductSales.objects.get(pk=self.lamp.pk), ProductSales.objects.get(pk=self.desk.pk)
+        self.assertAlmostEqual(velocity(lamp.demand_score, self.now), 2)
+        self.assertAlmostEqual(velocity(desk.demand_score, self.now), 2 / math.e)
+
+        record_refunds([(self.desk.pk, 14, 1400, week_ago)], when=self.now)
+        desk.refresh_from_db()
+        self.assertAlmostEqual(velocity(desk.demand_score, self.now), 0)
+
+    def test_far_future_sales_rebase_the_epoch(self):
+        record_sales([(self.lamp.pk, 7, 70)], when=self.now)
+        later = self.now + timedelta(days=settings.VELOCITY_DAYS * (REBASE_PERIODS + 1))
+        record_sales([(self.desk.pk, 7, 700)], when=later)
+        self.assertEqual(demand_epoch(), later)
+        lamp, desk = ProductSales.objects.get(pk=self.lamp.pk), ProductSales.objects.get(pk=self.desk.pk)
+        self.assertAlmostEqual(velocity(desk.demand_score, later), 1)
+        self.assertAlmostEqual(velocity(lamp.demand_score, later), math.exp(-REBASE_PERIODS - 1))
+
+        # Years without a rebase would overflow a float weight.
+        record_sales([(self.lamp.pk, 1, 10)], when=later + timedelta(days=365 * 15))
+
+    def test_forecast_command_feeds_stock_report(self):
+        record_sales([(self.lamp.pk, 14, 140), (self.desk.pk, 7, 700)], when=self.now)
+        out = StringIO()
+        call_command('forecast_stock', batch_size=2, stdout=out)
+        self.assertIn('Forecast 3 products', out.getvalue())
+        self.assertIn('2 run out within', out.getvalue())
+
+        lamp = StockForecast.objects.get(pk=self.lamp.pk)
+        self.assertEqual(lamp.reorder_point, 6)
+        self.assertAlmostEqual((lamp.stockout_at - lamp.computed_at) / timedelta(days=1), 5, places=3)
+        self.assertIsNone(StockForecast.objects.get(pk=self.chair.pk).stockout_at)
+
+        staff = User.objects.create_user(username='staff', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        # user and balance (the session comes from the cache), forecast products
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('stock_report'))
+        self.assertEqual(list(response.context['products']), [self.desk, self.lamp])
+        self.assertContains(response, 'Low', count=1)
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='secret', wallet=500)
+        self.product = Product.objects.create(name='Chair', description='Oak', price=100, stock=3)
+
+    def test_buy_debits_wallet_and_stock(self):
+        buy_product(self.user, self.product.pk, 2)
+        self.product.refresh_from_db()
+        self.assertEqual(User.objects.get(pk=self.user.pk).balance, 300)
+        self.assertEqual(self.product.stock, 1)
+        self.assertEqual(Purchase.objects.get().quantity, 2)
+
+    def test_rejected_purchase_leaves_no_trace(self):
+        with self.assertRaises(OutOfStock):
+            buy_product(self.user, self.product.pk, 4)
+        self.product.stock = 10
+        self.product.save()
+        with self.assertRaises(InsufficientFunds):
+            buy_product(self.user, self.product.pk, 6)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 10)
+        self.assertFalse(Purchase.objects.exists())
+
+    def test_view_reports_missing_stock(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('buy_product', args=[self.product.pk]), {'quantity': 5})
+        self.assertContains(response, 'Not enough items in stock.')
+
+    def test_view_rejects_out_of_range_quantities(self):
+        self.client.force_login(self.user)
+        for quantity in ('0', '2147483648', '99999999999999999999'):
+            response = self.client.post(reverse('buy_product', args=[self.product.pk]), {'quantity': quantity})
+            self.assertContains(response, 'Invalid quantity.')
+        self.assertFalse(Purchase.objects.exists())
+
+
+class CartCheckoutTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='secret', wallet=1000)
+        self.products = [
+            Product.objects.create(name=f'Item {i}', description='Cart item', price=10, stock=5) for i in range(10)
+        ]
+        self.client.force_login(self.user)
+
+    def post_cart(self, items):
+        return self.client.post(reverse('cart_checkout'), json.dumps({'items': items}),
+                                content_type='application/json')
+
+    def test_cart_uses_constant_queries(self):
+        items = [{'product_id': product.pk, 'quantity': 2} for product in self.products]
+        # user (the session comes from the cache), transaction savepoint pair, lock/select, locked balance,
+        # ledger debit, stock, bulk insert, then the sales stats job inserted on commit
+        with self.assertNumQueries(9) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = self.post_cart(items)
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('ORDER BY "main_product"."id" ASC', queries[2]['sql'])
+        self.assertEqual(User.objects.get(pk=self.user.pk).balance, 800)
+        self.assertEqual(Purchase.objects.count(), 10)
+        self.assertEqual(set(Product.objects.values_list('stock', flat=True)), {3})
+
+    def test_cart_is_all_or_nothing(self):
+        response = self.post_cart([
+            {'product_id': self.products[0].pk, 'quantity': 1},
+            {'product_id': self.products[1].pk, 'quantity': 6},
+        ])
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Purchase.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).stock, 5)
+
+    def test_cart_rejects_malformed_items(self):
+        pk = self.products[0].pk
+        for items in ([{'product_id': 2 ** 70, 'quantity': 1}], [{'product_id': pk, 'quantity': 1.9}],
+                      [{'product_id': pk, 'quantity': 2 ** 31}], [{'product_id': pk, 'quantity': 2 ** 30}] * 2,
+                      [{'product_id': str(pk), 'quantity': 1}], [[pk, 1]], []):
+            response = self.post_cart(items)
+            self.assertEqual(response.json(), {'error': 'Malformed cart.'}, items)
+        response = self.post_cart([{'product_id': pk + 100, 'quantity': 1}])
+        self.assertEqual(response.json(), {'error': 'No Product matches the given query.'})
+        self.assertFalse(Purchase.objects.exists())
+
+
+class AdminPerformanceTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='secret')
+        self.product = Product.objects.create(name='Lamp', description='Desk lamp', stock=5)
+        self.client.force_login(self.admin)
+
+    def buy(self, count):
+        buyers = [User(username=f'buyer{Purchase.objects.count() + i}') for i in range(count)]
+        User.objects.bulk_create(buyers)
+        purchases = Purchase.objects.bulk_create(
+            Purchase(user=user, product=self.product, quantity=1, refundable_until=Purchase.refund_deadline())
+            for user in User.objects.filter(username__in=[buyer.username for buyer in buyers])
+        )
+        Refund.objects.bulk_create(Refund(refund_purchase=purchase) for purchase in purchases)
+
+    def changelist_queries(self, model_name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f'admin:main_{model_name}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelists_do_not_query_per_row(self):
+        self.buy(2)
+        self.changelist_queries('purchase')
+        before = {name: self.changelist_queries(name) for name in ('purchase', 'refund')}
+        self.buy(20)
+        self.assertEqual({name: self.changelist_queries(name) for name in ('purchase', 'refund')}, before)
+
+    def test_paginator_estimates_only_large_unfiltered_tables(self):
+        Product.objects.bulk_create(Product(name=f'Item {i}', description='Bulk', stock=1) for i in range(30))
+        paginator = EstimatedCountPaginator(Product.objects.order_by('pk'), 10)
+        paginator.exact_below = 10
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, 31)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+
+        filtered = EstimatedCountPaginator(Product.objects.filter(stock=1), 10)
+        filtered.exact_below = 10
+        self.assertEqual(filtered.count, 30)
+        self.assertEqual(EstimatedCountPaginator(Product.objects.all(), 10).count, 31)
+
+    def test_product_search_matches_prefixes(self):
+        response = self.client.get(reverse('admin:main_product_changelist'), {'q': 'lam'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.product])
+
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'main', 'model_name': 'purchase', 'field_name': 'product', 'term': 'des lam',
+        })
+        self.assertEqual([result['text'] for result in response.json()['results']], ['Lamp'])
+
+    def test_bulk_actions(self):
+        self.buy(3)
+        other = Product.objects.create(name='Desk', description='Oak desk', stock=1)
+        self.client.post(reverse('admin:main_product_changelist'), {
+            'action': 'restock', '_selected_action': [self.product.pk, other.pk],
+        })
+        self.assertEqual(Product.objects.get(pk=other.pk).stock, 101)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:main_refund_changelist'), {
+                'action': 'approve', '_selected_action': list(Refund.objects.values_list('pk', flat=True)),
+            })
+        self.assertFalse(Refund.objects.exists())
+        self.assertFalse(Purchase.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 108)
+
+
+@task
+def flaky_test_job(fail):
+    if fail:
+        raise RuntimeError('Flaky job failed.')
+
+
+class JobQueueTests(TestCase):
+    def test_jobs_are_inserted_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            enqueue('flaky_test_job', fail=False)
+            self.assertFalse(Job.objects.exists())
+        callbacks[0]()
+        self.assertEqual(queue_stats()['pending'], 1)
+        self.assertEqual(drain()['done'], 1)
+        self.assertFalse(Job.objects.exists())
+
+    def test_failed_jobs_back_off_then_give_up(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('flaky_test_job', fail=True)
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            self.assertEqual(drain()['failed'], 1)
+            job = Job.objects.get()
+            self.assertEqual(job.attempts, attempt)
+            self.assertGreater(job.run_at, timezone.now())
+            self.assertIn('Flaky job failed.', job.last_error)
+            Job.objects.update(run_at=timezone.now())
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(drain()['done'] + drain()['failed'], 0)
+        self.assertEqual(queue_stats()['failed'], 1)
+
+    def test_leased_jobs_are_not_claimed_twice(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('flaky_test_job', fail=False)
+        self.assertEqual(len(claim()), 1)
+        self.assertEqual(claim(), [])
+
+        Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(len(claim()), 1)
+
+    def test_expired_lease_is_not_run_by_its_old_worker(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('flaky_test_job', fail=True)
+        stale, = claim()
+        Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        current, = claim()
+
+        self.assertIsNone(run(stale))
+        self.assertFalse(run(current))
+        self.assertEqual(Job.objects.get().attempts, 1)
+
+    def test_failure_bookkeeping_retries_lock_errors(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('flaky_test_job', fail=True)
+        job, = claim()
+        update = QuerySet.update
+        calls = []
+
+        def locked_once(queryset, **kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', locked_once):
+            self.assertFalse(run(job))
+        self.assertEqual(len(calls), 2)
+        job = Job.objects.get()
+        self.assertEqual((job.attempts, job.locked_by), (1, ''))
+
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', password='secret', wallet=900)
+        self.product = Product.objects.create(name='Sneaker', description='Limited', price=100, stock=10)
+
+    def shard_stock(self):
+        return list(StockShard.objects.filter(product=self.product).order_by('index').values_list('stock', flat=True))
+
+    def test_split_and_merge_keep_the_total(self):
+        split_stock(self.product.pk, 3)
+        self.assertEqual(self.shard_stock(), [4, 3, 3])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+
+        merge_stock(self.product.pk)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.shard_stock()), (10, []))
+
+    def test_confirm_turns_a_hold_into_a_purchase(self):
+        split_stock(self.product.pk, 2)
+        hold = reserve(self.user, self.product.pk, 2)
+        self.assertEqual(sum(self.shard_stock()), 8)
+
+        purchase = confirm(self.user, hold.pk)
+        self.assertEqual((purchase.quantity, purchase.unit_price), (2, 100))
+        self.assertFalse(Reservation.objects.exists())
+        self.assertEqual(balance(self.user.pk), 700)
+        with self.assertRaises(ReservationExpired):
+            confirm(self.user, hold.pk)
+
+    def test_sweeper_returns_expired_holds_to_their_shard(self):
+        split_stock(self.product.pk, 2)
+        hold = reserve(self.user, self.product.pk, 3, ttl=60)
+        self.assertEqual(release_expired(), 0)
+
+        Reservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        with self.assertRaises(ReservationExpired):
+            confirm(self.user, hold.pk)
+        call_command('release_reservations', stdout=StringIO())
+        self.assertEqual(self.shard_stock(), [5, 5])
+        self.assertFalse(Purchase.objects.exists())
+
+    def test_failed_payment_keeps_the_hold(self):
+        hold = reserve(self.user, self.product.pk, 10)
+        with self.assertRaises(InsufficientFunds):
+            confirm(self.user, hold.pk)
+        self.assertTrue(Reservation.objects.filter(pk=hold.pk).exists())
+
+    def test_takes_span_shards(self):
+        split_stock(self.product.pk, 2)
+        with self.assertRaises(OutOfStock):
+            reserve(self.user, self.product.pk, 11)
+        self.assertEqual(self.shard_stock(), [5, 5])
+
+        hold = reserve(self.user, self.product.pk, 6)
+        self.assertEqual(sum(self.shard_stock()), 4)
+        release(self.user, hold.pk)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, sum(self.shard_stock())), (6, 4))
+
+        buy_product(self.user, self.product.pk, 9)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock + sum(self.shard_stock()), 1)
+
+    def test_cart_takes_sharded_stock(self):
+        split_stock(self.product.pk, 4)
+        lamp = Product.objects.create(name='Lamp', description='Light', price=10, stock=5)
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('cart_checkout'), json.dumps({'items': [
+            {'product_id': self.product.pk, 'quantity': 4}, {'product_id': lamp.pk, 'quantity': 2},
+        ]}), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sum(self.shard_stock()), 6)
+        self.assertEqual(Product.objects.get(pk=lamp.pk).stock, 3)
+
+    def test_json_endpoints_and_listed_stock(self):
+        split_stock(self.product.pk, 4)
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('reserve_product'), {'product_id': self.product.pk, 'quantity': 1},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertContains(self.client.get(reverse('product_list')), 'Stock: 9')
+        api = self.client.get(reverse('product_api'), {'fields': 'id,stock'}).json()
+        self.assertEqual(api['results'], [{'id': self.product.pk, 'stock': 9}])
+
+        hold_id = response.json()['id']
+        response = self.client.post(reverse('release_reservation', args=[hold_id]))
+        self.assertEqual(response.json(), {'released': hold_id})
+        response = self.client.post(reverse('confirm_reservation', args=[hold_id]))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(sum(self.shard_stock()), 10)
+
+    def test_reserve_rejects_malformed_items(self):
+        self.client.force_login(self.user)
+        for payload in ({'product_id': self.product.pk, 'quantity': 2 ** 31}, {'product_id': 2 ** 70, 'quantity': 1},
+                        {'product_id': self.product.pk, 'quantity': 1.5}, {'product_id': self.product.pk},
+                        {'product_id': str(self.product.pk), 'quantity': 0}, [1, 2]):
+            response = self.client.post(reverse('reserve_product'), payload, content_type='application/json')
+            self.assertEqual(response.json(), {'error': 'Malformed reservation.'}, payload)
+        with self.assertRaises(ValueError):
+            reserve(self.user, self.product.pk, 2 ** 31)
+        self.assertFalse(Reservation.objects.exists())
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    def test_hot_product_is_never_oversold(self):
+        product = Product.objects.create(name='Hot', description='Drop', price=1, stock=20)
+        users = [User.objects.create(username=f'user{i}', wallet=100) for i in range(6)]
+        sold = []
+
+        def worker(user):
+            for _ in range(10):
+                try:
+                    buy_product(user, product.pk, 1)
+                    sold.append(1)
+                except CheckoutError:
+                    pass
+            connection.close()
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(len(sold), 20)
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(Purchase.objects.count(), 20)
+        self.assertEqual(Job.objects.filter(name='update_sales_stats').count(), 20)
+
+    def test_parallel_purchases_keep_one_wallet_consistent(self):
+        product = Product.objects.create(name='Pen', description='Blue', price=1, stock=1000)
+        user = User.objects.create(username='spender', wallet=50)
+        sold = []
+
+        def worker():
+            for _ in range(15):
+                try:
+                    buy_product(user, product.pk, 1)
+                    sold.append(1)
+                except CheckoutError:
+                    pass
+            connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(sold), 50)
+        self.assertEqual(balance(user.pk), 0)
+        self.assertEqual(WalletTransaction.objects.filter(user=user).count(), 50)
+
+    def test_concurrent_refund_approvals_retry_lock_conflicts(self):
+        user = User.objects.create(username='returner', wallet=0)
+        product = Product.objects.create(name='Pen', description='Blue', price=1, stock=0)
+        refund_ids = [
+            Refund.objects.create(refund_purchase=Purchase.objects.create(user=user, product=product, quantity=1)).pk
+            for _ in range(24)
+        ]
+        approved = []
+
+        def worker(ids):
+            for refund_id in ids:
+                approved.append(approve_refunds([refund_id]))
+            connection.close()
+
+        threads = [threading.Thread(target=worker, args=(refund_ids[i::6],)) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(approved, [1] * 24)
+        self.assertFalse(Refund.objects.exists())
+        self.assertEqual(Product.objects.get(pk=product.pk).stock, 24)
+        self.assertEqual(balance(user.pk), 24)
+
+    def test_sharded_drop_is_never_oversold(self):
+        product = Product.objects.create(name='Drop', description='Sneaker', price=1, stock=30)
+        split_stock(product.pk, 4)
+        users = [User.objects.create(username=f'user{i}', wallet=100) for i in range(6)]
+        sold = []
+
+        def worker(user):
+            for _ in range(10):
+                try:
+                    confirm(user, reserve(user, product.pk, 1).pk)
+                    sold.append(1)
+                except CheckoutError:
+                    pass
+            connection.close()
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(sold), 30)
+        self.assertEqual(Purchase.objects.count(), 30)
+        self.assertEqual(StockShard.objects.filter(product=product).aggregate(total=Sum('stock'))['total'], 0)
+        self.assertFalse(Reservation.objects.exists())
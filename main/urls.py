@@ -1,6 +1,12 @@
+from django.conf import settings
 from django.urls import path
 from .views import (ProductList, Register, Login, Logout, AddProduct, EditProduct, DeleteProduct, PurchaseList,
-                    BuyProduct, RefundList, RefundAgree, CreateRefund)
+                    BuyProduct, CartCheckout, ReserveProduct, ConfirmReservation, ReleaseReservation, RefundList,
+                    RefundAgree, BatchRefunds, CreateRefund, SalesReport, StockReport, Export, ImportProducts, Metrics,
+                    ProductApi, AsyncProductList, AsyncPurchaseList, AsyncProductApi)
+
+if settings.ASYNC_VIEWS:
+    ProductList, PurchaseList, ProductApi = AsyncProductList, AsyncPurchaseList, AsyncProductApi
 
 urlpatterns = [
 
@@ -10,11 +16,22 @@ urlpatterns = [
     path('logout/', Logout.as_view(), name='logout'),
     path('products/add/', AddProduct.as_view(), name='add_product'),
     path('products/edit/<int:product_id>/', EditProduct.as_view(), name='edit_product'),
+    path('products/import/', ImportProducts.as_view(), name='import_products'),
+    path('api/products/', ProductApi.as_view(), name='product_api'),
     path('product_list/', ProductList.as_view(), name='product_list'),
     path('products/delete/<int:product_id>/', DeleteProduct.as_view(), name='delete_product'),
     path('products/buy/<int:product_id>/', BuyProduct.as_view(), name='buy_product'),
+    path('cart/checkout/', CartCheckout.as_view(), name='cart_checkout'),
+    path('reservations/', ReserveProduct.as_view(), name='reserve_product'),
+    path('reservations/<int:reservation_id>/confirm/', ConfirmReservation.as_view(), name='confirm_reservation'),
+    path('reservations/<int:reservation_id>/release/', ReleaseReservation.as_view(), name='release_reservation'),
     path('purchase_list/', PurchaseList.as_view(), name='purchase_list'),
     path('refunds/', RefundList.as_view(), name='refunds'),
     path('refund/create/<int:purchase_id>/', CreateRefund.as_view(), name='create_refund'),
     path('refund_agree/<int:refund_id>/', RefundAgree.as_view(), name='refund_agree'),
+    path('refunds/batch/', BatchRefunds.as_view(), name='batch_refunds'),
+    path('reports/sales/', SalesReport.as_view(), name='sales_report'),
+    path('reports/stock/', StockReport.as_view(), name='stock_report'),
+    path('exports/<str:name>/', Export.as_view(), name='export'),
+    path('metrics/', Metrics.as_view(), name='metrics'),
 ]
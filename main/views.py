@@ -1,37 +1,64 @@
-from datetime import timezone
+import csv
+import io
+import json
+from datetime import timedelta
+from functools import partial
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
-from django.contrib.auth import login
+from django.contrib.auth import get_user, login
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import LoginView, LogoutView
+from django.db import connection
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django.views import View
+from django.views.decorators.http import condition
 from django.views.generic import ListView
 from django.views.generic.edit import FormView
-from .forms import UserCreationForm, ProductForm
+from .exports import EXPORTS, csv_chunks, export_rows, gzip_chunks, ndjson_chunks
+from .filters import filter_date_range
+from .forms import UserCreationForm, ProductForm, ProductImportUploadForm
+from .imports import import_products, read_rows
+from .jobs import queue_stats
+from .metrics import prometheus_text
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Product, Purchase, Refund
+from .catalog_cache import catalog_cache
+from .checkout import CheckoutError, InsufficientFunds, OutOfStock, buy_cart, buy_product, check_quantity
+from .models import DailySales, Product, ProductSales, Purchase, Refund
+from .pagination import KeysetPaginationMixin
+from .refunds import approve_refunds, reject_refunds, request_refund
+from .reservations import confirm, release, reserve
+from .retry import conflicts
+from .search import search_products
+from .stock import with_available_stock
 from django.utils import timezone
 
 
 class CreateRefund(LoginRequiredMixin, View):
     def post(self, request, purchase_id):
-        purchase = get_object_or_404(Purchase, pk=purchase_id)
-
-        if Refund.objects.filter(refund_purchase=purchase).exists():
-            messages.error(request, 'A refund already exists for this purchase.')
-            return redirect('purchase_list')
-
-        time_since_purchase = timezone.localtime(timezone.now()) - purchase.purchase_time
-        if time_since_purchase.total_seconds() > 180:
-            messages.error(request, 'The return period has expired.')
+        refund = request_refund(request.user.pk, purchase_id)
+        if refund is None:
+            messages.error(request, 'This purchase cannot be refunded: the return period has expired or a refund '
+                                    'was already requested.')
             return redirect('purchase_list')
 
-        refund = Refund.objects.create(refund_purchase=purchase)
         return render(request, 'main/refund/confirm_refund.html', {'refund': refund})
 
 
-class RefundList(LoginRequiredMixin, ListView):
+class RefundList(LoginRequiredMixin, KeysetPaginationMixin, ListView):
+    replica_reads = True
     model = Refund
     template_name = 'main/refund/refund_list.html'
+    keyset_descending = True
+
+    def get_queryset(self):
+        return Refund.objects.select_related('refund_purchase__user', 'refund_purchase__product').only(
+            'refund_time', 'refund_purchase__quantity', 'refund_purchase__user__username',
+            'refund_purchase__product__name',
+        )
 
 
 class RefundAgree(LoginRequiredMixin, View):
@@ -40,57 +67,143 @@ class RefundAgree(LoginRequiredMixin, View):
             messages.error(request, "The administrator must confirm your refund.")
             return redirect('login')
 
-        refund = get_object_or_404(Refund, pk=refund_id)
         action = request.POST.get('action')
-
+        # The retried chunk functions look the refund up themselves; a lookup here would run outside the retry.
         if action == 'agree':
-            purchase = refund.refund_purchase
+            handled = approve_refunds([refund_id])
+        elif action == 'reject':
+            handled = reject_refunds([refund_id])
+        else:
+            handled = Refund.objects.filter(pk=refund_id).exists()
+        if not handled:
+            raise Http404('No such refund.')
+
+        return redirect('refunds')
+
 
-            product = purchase.product
-            product.stock += purchase.quantity
-            product.save()
+class BatchRefunds(LoginRequiredMixin, View):
+    def post(self, request):
+        if not request.user.is_staff:
+            messages.error(request, "The administrator must confirm your refund.")
+            return redirect('login')
+
+        try:
+            refund_ids = [int(refund_id) for refund_id in request.POST.getlist('refund_ids')]
+        except ValueError:
+            messages.error(request, 'Invalid refund selection.')
+            return redirect('refunds')
 
-            purchase.delete()
-            refund.delete()
+        action = request.POST.get('action')
+        if action == 'agree':
+            messages.success(request, f'{approve_refunds(refund_ids)} refunds approved.')
         elif action == 'reject':
-            refund.delete()
+            messages.success(request, f'{reject_refunds(refund_ids)} refunds rejected.')
 
         return redirect('refunds')
 
 
 class BuyProduct(LoginRequiredMixin, View):
     def post(self, request, product_id):
-        product = get_object_or_404(Product, id=product_id)
-        quantity = int(request.POST.get('quantity'))
-
-        if product.stock < quantity:
+        try:
+            quantity = int(request.POST.get('quantity'))
+            buy_product(request.user, product_id, quantity)
+        except Product.DoesNotExist:
+            raise Http404('No Product matches the given query.')
+        except (TypeError, ValueError):
+            return render(request, 'main/product/product_list.html', {'error_message': 'Invalid quantity.'})
+        except OutOfStock:
             return render(request, 'main/product/product_list.html', {'error_message': 'Not enough items in stock.'})
-
-        user = request.user
-        total_price = product.price * quantity
-
-        if total_price > request.user.wallet:
+        except InsufficientFunds:
             messages.error(request, "You don't have enough funds for this purchase")
             return render(request, 'main/product/product_list.html', {'error_message': "You don't have enough money."})
 
-        user.wallet -= total_price
-        user.save()
+        return redirect('product_list')
 
-        Purchase.objects.create(user=request.user, product=product, quantity=quantity)
 
-        product.stock -= quantity
-        product.save()
+def parse_line_item(item):
+    """``(product_id, quantity)`` of a JSON line item; anything but in-range integers raises ValueError."""
+    product_id, quantity = item['product_id'], item['quantity']
+    low, high = connection.ops.integer_field_ranges[Product._meta.pk.get_internal_type()]
+    if type(product_id) is not int or type(quantity) is not int or not low <= product_id <= high:
+        raise ValueError('Line items need integer product_id and quantity.')
+    check_quantity(quantity)
+    return product_id, quantity
 
-        return redirect('product_list')
+
+class CartCheckout(LoginRequiredMixin, View):
+    def post(self, request):
+        try:
+            purchases = buy_cart(request.user, [parse_line_item(item) for item in json.loads(request.body)['items']])
+        except (KeyError, TypeError, ValueError):
+            return JsonResponse({'error': 'Malformed cart.'}, status=400)
+        except Product.DoesNotExist:
+            return JsonResponse({'error': 'No Product matches the given query.'}, status=404)
+        except CheckoutError as error:
+            return JsonResponse({'error': str(error)}, status=409)
+
+        return JsonResponse({'purchases': [
+            {'product_id': purchase.product_id, 'quantity': purchase.quantity} for purchase in purchases
+        ]}, status=201)
 
 
-class PurchaseList(LoginRequiredMixin, ListView):
+class ReserveProduct(LoginRequiredMixin, View):
+    def post(self, request):
+        try:
+            reservation = reserve(request.user, *parse_line_item(json.loads(request.body)))
+        except (KeyError, TypeError, ValueError):
+            return JsonResponse({'error': 'Malformed reservation.'}, status=400)
+        except Product.DoesNotExist:
+            return JsonResponse({'error': 'No Product matches the given query.'}, status=404)
+        except CheckoutError as error:
+            return JsonResponse({'error': str(error)}, status=409)
+
+        return JsonResponse({
+            'id': reservation.pk,
+            'product_id': reservation.product_id,
+            'quantity': reservation.quantity,
+            'expires_at': reservation.expires_at.isoformat(),
+        }, status=201)
+
+
+class ConfirmReservation(LoginRequiredMixin, View):
+    def post(self, request, reservation_id):
+        try:
+            purchase = confirm(request.user, reservation_id)
+        except CheckoutError as error:
+            return JsonResponse({'error': str(error)}, status=409)
+
+        return JsonResponse({'purchase': {'product_id': purchase.product_id, 'quantity': purchase.quantity}},
+                            status=201)
+
+
+class ReleaseReservation(LoginRequiredMixin, View):
+    def post(self, request, reservation_id):
+        if not release(request.user, reservation_id):
+            raise Http404('No Reservation matches the given query.')
+        return JsonResponse({'released': reservation_id})
+
+
+class PurchaseList(LoginRequiredMixin, KeysetPaginationMixin, ListView):
+    replica_reads = True
     model = Purchase
     template_name = 'main/purchase/purchase_list.html'
     context_object_name = 'purchases'
+    keyset_fields = ('purchase_time', 'pk')
+    keyset_descending = True
 
     def get_queryset(self):
-        return Purchase.objects.filter(user=self.request.user)
+        queryset = filter_date_range(Purchase.objects.filter(user=self.request.user), 'purchase_time', self.request.GET)
+        return queryset.select_related('product').only('quantity', 'purchase_time', 'product__name').annotate(
+            can_refund=ExpressionWrapper(
+                Q(refundable_until__gt=timezone.now(), refund__isnull=True), output_field=BooleanField(),
+            ),
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['date_from'] = self.request.GET.get('from', '')
+        context['date_to'] = self.request.GET.get('to', '')
+        return context
 
 
 class DeleteProduct(LoginRequiredMixin, View):
@@ -143,11 +256,267 @@ class AddProduct(LoginRequiredMixin, View):
         return render(request, 'main/product/add_product.html', {'form': form})
 
 
-class ProductList(ListView):
+class SalesReport(LoginRequiredMixin, View):
+    replica_reads = True
+    top_limit = 20
+    days_limit = 30
+
+    def get(self, request):
+        if not request.user.is_staff:
+            return redirect('login')
+
+        order = '-revenue' if request.GET.get('by') == 'revenue' else '-units_sold'
+        top_sellers = ProductSales.objects.select_related('product').only(
+            'units_sold', 'revenue', 'refunded_units', 'refunded_amount', 'product__name',
+        ).order_by(order)[:self.top_limit]
+        days = DailySales.objects.order_by('-day')[:self.days_limit]
+        return render(request, 'main/report/sales.html', {'top_sellers': top_sellers, 'days': days})
+
+
+class StockReport(LoginRequiredMixin, View):
+    replica_reads = True
+    limit = 50
+
+    def get(self, request):
+        if not request.user.is_staff:
+            return redirect('login')
+
+        horizon = timezone.now() + timedelta(days=settings.STOCKOUT_HORIZON_DAYS)
+        products = with_available_stock(Product.objects.select_related('forecast').only(
+            'name', 'stock', 'forecast__velocity', 'forecast__reorder_point', 'forecast__stockout_at',
+            'forecast__computed_at',
+        )).filter(forecast__stockout_at__lte=horizon).order_by('forecast__stockout_at')[:self.limit]
+        return render(request, 'main/report/stock.html', {
+            'products': products, 'horizon_days': settings.STOCKOUT_HORIZON_DAYS,
+        })
+
+
+class Metrics(LoginRequiredMixin, View):
+    def get(self, request):
+        if not request.user.is_staff:
+            return redirect('login')
+
+        queue = queue_stats()
+        text = prometheus_text(extra_gauges=(
+            ('shop_checkout_conflicts_per_second', 'Checkout lock conflicts per second.', conflicts.per_second()),
+            ('shop_catalog_cache_hit_ratio', 'Catalog cache hit ratio.', catalog_cache.hit_ratio()),
+            ('shop_jobs_pending', 'Background jobs waiting to run.', queue['pending']),
+            ('shop_jobs_failed', 'Background jobs that ran out of retries.', queue['failed']),
+            ('shop_job_lag_seconds', 'Age of the oldest ready background job.', queue['lag_seconds']),
+        ))
+        return HttpResponse(text, content_type='text/plain; version=0.0.4')
+
+
+class Export(LoginRequiredMixin, View):
+    replica_reads = True
+    formats = {
+        'csv': (csv_chunks, 'text/csv'),
+        'ndjson': (ndjson_chunks, 'application/x-ndjson'),
+    }
+
+    def get(self, request, name):
+        if not request.user.is_staff:
+            return redirect('login')
+        export_format = request.GET.get('format', 'csv')
+        if name not in EXPORTS or export_format not in self.formats:
+            raise Http404('Unknown export.')
+
+        model, time_field, columns = EXPORTS[name]
+        render_chunks, content_type = self.formats[export_format]
+        rows = export_rows(filter_date_range(model.objects.all(), time_field, request.GET), columns)
+        chunks = render_chunks(columns, rows)
+        filename = f'{name}.{export_format}'
+
+        if request.GET.get('gzip') == '1':
+            chunks, content_type, filename = gzip_chunks(chunks), 'application/gzip', filename + '.gz'
+
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class ImportProducts(LoginRequiredMixin, View):
+    def get(self, request):
+        if not request.user.is_staff:
+            return redirect('login')
+
+        form = ProductImportUploadForm()
+        return render(request, 'main/product/import_products.html', {'form': form})
+
+    def post(self, request):
+        if not request.user.is_staff:
+            return redirect('login')
+
+        form = ProductImportUploadForm(request.POST, request.FILES)
+        if not form.is_valid():
+            return render(request, 'main/product/import_products.html', {'form': form})
+
+        file = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8-sig', newline='')
+        rows = read_rows(file, form.cleaned_data['format'])
+        try:
+            reports = list(import_products(rows, dry_run=form.cleaned_data['dry_run']))
+        except (csv.Error, ValueError) as error:
+            form.add_error('file', f'Could not read the file: {error}')
+            return render(request, 'main/product/import_products.html', {'form': form})
+
+        return render(request, 'main/product/import_products.html', {
+            'form': form,
+            'reports': reports,
+            'imported': sum(report['imported'] for report in reports),
+            'rejected': [row for report in reports for row in report['rejected']],
+        })
+
+
+class ProductList(KeysetPaginationMixin, ListView):
+    replica_reads = True
     model = Product
     template_name = 'main/product/product_list.html'
     context_object_name = 'products'
 
+    def get_queryset(self):
+        return with_available_stock(search_products(Product.objects.all(), self.request.GET.get('q', '')))
+
+    def paginate_keyset(self, queryset):
+        parts = (self.request.GET.get('q', ''), self.get_cursor())
+        return catalog_cache.get_or_set('product_page', parts, partial(super().paginate_keyset, queryset))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.request.GET.get('q', '')
+        return context
+
+
+class ProductApi(KeysetPaginationMixin, View):
+    replica_reads = True
+    model = Product
+    page_size = 100
+    api_fields = ('id', 'sku', 'name', 'description', 'price', 'stock')
+
+    def get_fields(self):
+        fields = self.request.GET.get('fields')
+        if not fields:
+            return self.api_fields
+        fields = tuple(dict.fromkeys(field.strip() for field in fields.split(',')))
+        if not set(fields) <= set(self.api_fields):
+            return None
+        return fields
+
+    def catalog_etag(self, request, version=None):
+        params = sorted(request.GET.lists())
+        return catalog_cache.key('product_api', params, version=version).replace(':', '-')
+
+    def catalog_last_modified(self, request):
+        return catalog_cache.last_modified()
+
+    def dispatch(self, request, *args, **kwargs):
+        conditional = condition(etag_func=self.catalog_etag, last_modified_func=self.catalog_last_modified)
+        return conditional(super().dispatch)(request, *args, **kwargs)
+
+    def invalid_fields_response(self):
+        return JsonResponse({'error': f'fields must be a subset of {", ".join(self.api_fields)}.'}, status=400)
+
+    def get(self, request):
+        fields = self.get_fields()
+        if fields is None:
+            return self.invalid_fields_response()
+
+        parts = (fields, request.GET.get('q', ''), self.get_cursor())
+        return JsonResponse(catalog_cache.get_or_set('product_api', parts, partial(self.render_page, fields)))
+
+    def get_page_queryset(self, fields):
+        queryset = search_products(Product.objects.only(*fields), self.request.GET.get('q', ''))
+        return with_available_stock(queryset) if 'stock' in fields else queryset
+
+    def serialize_value(self, product, field):
+        # Sharded units are still for sale; report them the way the product list does.
+        return product.available_stock if field == 'stock' else getattr(product, field)
+
+    def serialize_page(self, fields, products, next_cursor):
+        return {
+            'results': [{field: self.serialize_value(product, field) for field in fields} for product in products],
+            'next': next_cursor,
+        }
+
+    def render_page(self, fields):
+        return self.serialize_page(fields, *self.paginate_keyset(self.get_page_queryset(fields)))
+
+
+def _load_user(request):
+    user = get_user(request)
+    if user.is_authenticated:
+        # The page header shows the balance; CachedModelBackend caches it, ModelBackend leaves it lazy.
+        user.balance
+    return user
+
+
+async def aresolve_user(request):
+    # Load the session user once in a thread so templates and context processors never touch the DB lazily.
+    request.user = await sync_to_async(_load_user)(request)
+    return request.user
+
+
+class AsyncProductList(ProductList):
+    async def get(self, request):
+        await aresolve_user(request)
+        queryset = self.get_queryset()
+        parts = (request.GET.get('q', ''), self.get_cursor())
+        products, next_cursor = await catalog_cache.aget_or_set(
+            'product_page', parts, partial(self.apaginate_keyset, queryset),
+        )
+        context = {
+            'products': products,
+            'object_list': products,
+            'query': request.GET.get('q', ''),
+            **self.get_keyset_context(next_cursor),
+        }
+        return render(request, self.template_name, context)
+
+
+class AsyncPurchaseList(PurchaseList):
+    async def get(self, request):
+        if not (await aresolve_user(request)).is_authenticated:
+            return self.handle_no_permission()
+
+        purchases, next_cursor = await self.apaginate_keyset(self.get_queryset())
+        context = {
+            'purchases': purchases,
+            'object_list': purchases,
+            'date_from': request.GET.get('from', ''),
+            'date_to': request.GET.get('to', ''),
+            **self.get_keyset_context(next_cursor),
+        }
+        return render(request, self.template_name, context)
+
+    async def dispatch(self, request, *args, **kwargs):
+        # LoginRequiredMixin.dispatch reads request.user synchronously; get() checks it instead.
+        return await View.dispatch(self, request, *args, **kwargs)
+
+
+class AsyncProductApi(ProductApi):
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await self.http_method_not_allowed(request)
+
+        etag = quote_etag(self.catalog_etag(request, version=await catalog_cache.aversion()))
+        last_modified = await catalog_cache.alast_modified()
+        response = get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+        if response is None:
+            response = await self.get(request)
+        response.headers.setdefault('ETag', etag)
+        response.headers.setdefault('Last-Modified', http_date(last_modified.timestamp()))
+        return response
+
+    async def get(self, request):
+        fields = self.get_fields()
+        if fields is None:
+            return self.invalid_fields_response()
+
+        parts = (fields, request.GET.get('q', ''), self.get_cursor())
+        return JsonResponse(await catalog_cache.aget_or_set('product_api', parts, partial(self.arender_page, fields)))
+
+    async def arender_page(self, fields):
+        return self.serialize_page(fields, *await self.apaginate_keyset(self.get_page_queryset(fields)))
+
 
 class Login(LoginView):
     template_name = 'main/user/login.html'
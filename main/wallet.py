@@ -0,0 +1,70 @@
+from django.db import transaction
+from django.db.models import DecimalField, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .auth import forget_users
+from .bulk import add_fields_by_pk
+from .models import User, WalletTransaction
+
+
+class InsufficientFunds(Exception):
+    pass
+
+
+def _pending_delta():
+    pending = WalletTransaction.objects.filter(user=OuterRef('pk'), pk__gt=OuterRef('wallet_snapshot_id'))
+    return Coalesce(
+        Subquery(pending.order_by().values('user').annotate(total=Sum('amount')).values('total')),
+        Value(0),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def balance(user_id, lock=False):
+    """Snapshot plus the ledger entries newer than it; ``lock`` serializes writers of the same wallet."""
+    users = User.objects.select_for_update() if lock else User.objects
+    wallet, delta = users.filter(pk=user_id).annotate(delta=_pending_delta()).values_list('wallet', 'delta').get()
+    return wallet + delta
+
+
+def debit(user_id, amount, kind=WalletTransaction.PURCHASE):
+    """Append a debit if the balance covers it; call inside the transaction that makes the purchase."""
+    if balance(user_id, lock=True) < amount:
+        raise InsufficientFunds("You don't have enough money.")
+    forget_users([user_id])
+    return WalletTransaction.objects.create(user_id=user_id, amount=-amount, kind=kind)
+
+
+def credit(credits, kind=WalletTransaction.REFUND):
+    """Append one credit per ``{user_id: amount}`` entry with a single bulk insert; call inside a transaction.
+
+    The users stay locked until it commits, like a debit, so compact() never folds past an uncommitted credit.
+    """
+    list(User.objects.select_for_update().filter(pk__in=credits).order_by('pk').values_list('pk', flat=True))
+    forget_users(credits)
+    return WalletTransaction.objects.bulk_create(
+        WalletTransaction(user_id=user_id, amount=amount, kind=kind) for user_id, amount in credits.items()
+    )
+
+
+def compact(user_ids, prune_before=None):
+    """Fold ledger entries into the users' snapshots, optionally deleting folded entries older than a cutoff."""
+    with transaction.atomic():
+        users = User.objects.select_for_update().filter(pk__in=user_ids).order_by('pk')
+        snapshots = dict(users.values_list('pk', 'wallet_snapshot_id'))
+        pending = WalletTransaction.objects.filter(user_id__in=snapshots, pk__gt=F('user__wallet_snapshot_id'))
+        totals = pending.values('user_id').annotate(total=Sum('amount'), last=Max('pk')).order_by()
+        folds = {
+            row['user_id']: {'wallet': row['total'], 'wallet_snapshot_id': row['last'] - snapshots[row['user_id']]}
+            for row in totals
+        }
+        add_fields_by_pk(User, folds)
+        User.objects.filter(pk__in=folds).update(wallet_snapshot_time=timezone.now())
+
+        if prune_before is not None:
+            WalletTransaction.objects.filter(
+                user_id__in=snapshots, created_at__lt=prune_before, pk__lte=F('user__wallet_snapshot_id'),
+            ).delete()
+        forget_users(snapshots)
+        return len(folds)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.middleware.RequestTimingMiddleware',
+    'main.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,12 +55,37 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'myshop.urls'
 
+# Seconds after a purchase during which it can be refunded, and days a pending refund waits for review
+# before expire_refunds rejects it.
+REFUND_WINDOW_SECONDS = 180
+REFUND_REVIEW_DAYS = 14
+
+# Seconds a stock reservation holds its units, and the default number of stock shards for a hot product.
+RESERVATION_TTL = 120
+STOCK_SHARDS = 8
+
+# Purchase velocity decays over VELOCITY_DAYS. Products whose stock covers less than RESTOCK_LEAD_DAYS of sales
+# are low on stock, and the stock report lists products forecast to run out within STOCKOUT_HORIZON_DAYS.
+VELOCITY_DAYS = 7
+RESTOCK_LEAD_DAYS = 3
+STOCKOUT_HORIZON_DAYS = 14
+
+# Samples kept per URL name for the /metrics/ quantiles, and the threshold for the slow query log.
+REQUEST_METRICS_WINDOW = 1000
+SLOW_QUERY_MS = float(os.environ.get('SHOP_SLOW_QUERY_MS', 100))
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compile each template once per process; runserver's autoreloader resets the cache on edits.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -69,18 +97,121 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'myshop.wsgi.application'
+ASGI_APPLICATION = 'myshop.asgi.application'
+
+# Serve the catalog and purchase history from async views; only worth it under an ASGI server.
+ASYNC_VIEWS = os.environ.get('SHOP_ASYNC_VIEWS') == '1'
 
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+# SHOP_DB picks the profile: sqlite (default) or postgres.
 
-DATABASES = {
-    'default': {
+DATABASE_PROFILES = {
+    'sqlite': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('SHOP_DB_NAME', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.environ.get('SHOP_DB_CONN_MAX_AGE', 60)),
+        'OPTIONS': {
+            # Seconds the sqlite3 driver waits on a locked database before raising.
+            'timeout': 20,
+        },
+    },
+    'postgres': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('SHOP_DB_NAME', 'myshop'),
+        'USER': os.environ.get('SHOP_DB_USER', 'myshop'),
+        'PASSWORD': os.environ.get('SHOP_DB_PASSWORD', ''),
+        'HOST': os.environ.get('SHOP_DB_HOST', '127.0.0.1'),
+        'PORT': os.environ.get('SHOP_DB_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.environ.get('SHOP_DB_CONN_MAX_AGE', 300)),
+        'CONN_HEALTH_CHECKS': True,
+        # Transaction-pooling bouncers such as PgBouncer cannot keep server-side cursors open.
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('SHOP_DB_POOLER') == 'pgbouncer',
+    },
+}
+
+DATABASES = {
+    'default': DATABASE_PROFILES[os.environ.get('SHOP_DB', 'sqlite')],
+}
+
+# SHOP_DB_REPLICA names a read replica of the same profile: a second SQLite file (refresh it with sync_replica)
+# or a Postgres standby database, optionally on SHOP_DB_REPLICA_HOST. Views marked replica_reads read from it.
+if os.environ.get('SHOP_DB_REPLICA'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['SHOP_DB_REPLICA'],
+        'HOST': os.environ.get('SHOP_DB_REPLICA_HOST', DATABASES['default'].get('HOST', '')),
+        'TEST': {'MIRROR': 'default'},
     }
+
+DATABASE_ROUTERS = ['main.routers.ReplicaRouter']
+
+# Seconds a client keeps reading from the primary after a write, and the catalog cache fills from it after a
+# catalog change; both should exceed the replica lag.
+REPLICA_STICKY_SECONDS = 5
+
+# Applied to every new SQLite connection; set SHOP_SQLITE_PRAGMAS=0 to measure the driver defaults.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 2 ** 20,
+    'temp_store': 'MEMORY',
+} if os.environ.get('SHOP_SQLITE_PRAGMAS', '1') == '1' else {}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'myshop',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('SHOP_CACHE_LOCATION', BASE_DIR / 'cache'),
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': os.environ.get('SHOP_CACHE_LOCATION', 'shop_cache'),
+    },
+}
+
+CACHES = {
+    'default': CACHE_BACKENDS[os.environ.get('SHOP_CACHE', 'locmem')],
+    # Used by {% cache %}. Fragments are keyed by product id and updated_at, so a per-process cache never serves
+    # stale markup; it only needs room for a whole catalog page set.
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template-fragments',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
 }
 
+CATALOG_CACHE_TIMEOUT = 300
+
+
+# Sessions and authentication
+# SHOP_SESSION_ENGINE: cached_db (default), db, cache or signed_cookies.
+# SHOP_USER_CACHE=1 serves the session user from the cache. It needs a cache shared by all workers, so it is off
+# by default with the per-process locmem cache; otherwise the user is loaded on every request, as stock Django does.
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + os.environ.get('SHOP_SESSION_ENGINE', 'cached_db')
+
+AUTHENTICATION_BACKENDS = [
+    'main.auth.CachedModelBackend'
+    if os.environ.get('SHOP_USER_CACHE', '0' if os.environ.get('SHOP_CACHE', 'locmem') == 'locmem' else '1') == '1'
+    else 'django.contrib.auth.backends.ModelBackend',
+]
+
+USER_CACHE_TIMEOUT = 300
+
+if os.environ.get('SHOP_FAST_PASSWORD_HASHER') == '1':
+    # Load tests only: logins and registrations stop being dominated by PBKDF2. Never enable in production.
+    PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators